@@ -0,0 +1,12 @@
+from .board import Board, EMPTY, WHITE, BLACK, BLOC
+from .heuristics import heuristic_v1, heuristic_v2, heuristic_windows, HEURISTICS
+from .search import Searcher
+from .scores import WIN, INFINITY
+from .transposition import TranspositionTable, MappedTranspositionTable, EXACT, LOWER, UPPER
+from .zobrist import zobrist_keys
+from .ordering import MoveOrderer, PlainOrderer, TacticalOrderer
+from .evaluator import IncrementalEvaluator
+from .parallel import ParallelSearcher
+from .symmetry import Symmetry
+from .stats import SearchStats
+from .api import Engine, Position, Limits, SearchResult
@@ -0,0 +1,430 @@
+# Headless engine API.
+#
+# A Position (n, s, blocs, pieces, side to move) and Limits (depth, time,
+# nodes) go in, a SearchResult (move, value, PV, stats) comes out. Nothing is
+# printed, read or written, and the caller's objects are never touched: the
+# Engine searches its own Board, which it keeps between calls so the
+# transposition table and the incremental evaluation stay warm as long as the
+# bloc layout doesn't change. Game.play is a frontend over this.
+
+from timeout import Deadline, TimeoutError
+
+from .board import Board, WHITE, BLACK, BLOC
+from .evaluator import IncrementalEvaluator
+from .heuristics import HEURISTICS
+from .ordering import make_orderer
+from .parallel import ParallelSearcher
+from .mcts import MCTS, ParallelMCTS, best
+from .search import Searcher
+from .solver import Solver
+from .stats import SearchStats
+from .symmetry import Symmetry
+from .transposition import TranspositionTable, MappedTranspositionTable, DEPTH, table_config
+
+
+def cells(board, mask):
+    # (x, y) of every bit in mask
+    result = []
+    while mask:
+        move = mask & -mask
+        mask ^= move
+        result.append(board.coords(move))
+    return result
+
+
+class Position:
+    """
+    A board to search: blocs and pieces as lists of (x, y), max is True
+    when • is to move (by default whoever has fewer pieces, ◦ on a tie).
+    """
+
+    def __init__(self, n, s, blocks=(), white=(), black=(), max=None):
+        self.n = n
+        self.s = s
+        self.blocks = [tuple(cell) for cell in blocks]
+        self.white = [tuple(cell) for cell in white]
+        self.black = [tuple(cell) for cell in black]
+        if max is None:
+            max = len(self.white) > len(self.black)
+        self.max = max
+
+    @classmethod
+    def from_board(cls, board, max=None):
+        return cls(board.n, board.s, cells(board, board.pieces[BLOC]),
+                   cells(board, board.pieces[WHITE]), cells(board, board.pieces[BLACK]), max)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['n'], d['s'], d.get('blocks', ()), d.get('white', ()), d.get('black', ()), d.get('max'))
+
+    def to_dict(self):
+        return {'n': self.n, 's': self.s, 'blocks': self.blocks, 'white': self.white, 'black': self.black, 'max': self.max}
+
+    def layout(self):
+        return (self.n, self.s, tuple(sorted(self.blocks)))
+
+    def to_board(self):
+        board = Board(self.n, self.s, self.blocks)
+        for (piece, pieces) in ((WHITE, self.white), (BLACK, self.black)):
+            for (x, y) in pieces:
+                board.make(board.move(x, y), piece)
+        return board
+
+
+class Limits:
+    """
+    When to stop: deepest iteration, seconds and nodes. None is no limit.
+    stop is an Event (threading or multiprocessing) that ends the search
+    early once it is set, see StopSignal.
+    """
+
+    def __init__(self, depth=None, time=None, nodes=None, stop=None):
+        self.depth = depth
+        self.time = time
+        self.nodes = nodes
+        self.stop = stop
+
+
+class NodeBudget:
+    """
+    Deadline that also runs out once the search has visited nodes nodes.
+    """
+
+    def __init__(self, deadline, stats, nodes):
+        self.deadline = deadline
+        self.stats = stats
+        self.nodes = nodes
+
+    def elapsed(self):
+        return self.deadline.elapsed()
+
+    def remaining(self):
+        return self.deadline.remaining()
+
+    def expired(self):
+        return self.deadline.expired() or self.stats.total_nodes() >= self.nodes
+
+    def check(self):
+        self.deadline.check()
+        if self.stats.total_nodes() >= self.nodes:
+            raise TimeoutError('Node limit')
+
+
+class StopSignal:
+    """
+    Deadline that also runs out once stop is set. is_set() takes a lock, so
+    check() only looks every interval calls.
+    """
+
+    def __init__(self, deadline, stop, interval=256):
+        self.deadline = deadline
+        self.stop = stop
+        self.interval = interval
+        self.count = 0
+
+    def elapsed(self):
+        return self.deadline.elapsed()
+
+    def remaining(self):
+        return self.deadline.remaining()
+
+    def expired(self):
+        return self.deadline.expired() or self.stop.is_set()
+
+    def check(self):
+        self.deadline.check()
+        self.count += 1
+        if self.count >= self.interval:
+            self.count = 0
+            if self.stop.is_set():
+                raise TimeoutError('Stopped')
+
+
+class SearchResult:
+    """
+    What a search found. move is (x, y), or None if no iteration finished.
+    """
+
+    def __init__(self, value, move, pv, depth, timed_out, stats, eval_by_depth, tt_stats=None, ordering_stats=None, book=False, solved=False):
+        self.value = value
+        self.move = move
+        self.pv = pv
+        self.depth = depth
+        self.timed_out = timed_out
+        self.stats = stats
+        self.eval_by_depth = eval_by_depth
+        self.tt_stats = tt_stats
+        self.ordering_stats = ordering_stats
+        # True when the move came from the opening book without a search
+        self.book = book
+        # True when the value is the proven game result, see solver.Solver
+        self.solved = solved
+
+    def as_tuple(self):
+        # (value, x, y) like the Game search methods
+        if self.move is None:
+            return (self.value, None, None)
+        return (self.value, *self.move)
+
+    def to_dict(self):
+        return {
+            'value': self.value,
+            'move': self.move,
+            'pv': self.pv,
+            'depth': self.depth,
+            'timed_out': self.timed_out,
+            'book': self.book,
+            'solved': self.solved,
+            'eval_by_depth': self.eval_by_depth,
+            'stats': self.stats.to_dict(),
+        }
+
+
+class Engine:
+    """
+    Searches Positions under Limits. heuristics names the heuristics that
+    are kept up to date incrementally, others are computed from scratch.
+    With a book (book.OpeningBook) positions in it are answered from it.
+    With a tt_path the table is a MappedTranspositionTable in that file,
+    opened by the first search, and the Engine keeps to that search's n and s.
+    Positions with at most solve_below empty cells are solved exactly first.
+    tactics searches only forced moves when there are any, see
+    ordering.TacticalOrderer. ordering=False searches moves in row-major
+    order whatever tactics says. symmetry shares table entries between
+    rotations and reflections, with the heuristics in heuristics.SYMMETRIC
+    only. mcts_c, mcts_batch (playouts per new leaf, see batch.playouts) and
+    seed are for the 'mcts' algorithm, where limits.nodes counts playouts and
+    limits.depth doesn't apply.
+    """
+
+    ALGOS = ('minimax', 'alphabeta', 'pvs', 'mcts')
+
+    # playouts per MCTS search when there is neither a time nor a node limit
+    MCTS_PLAYOUTS = 10000
+
+    def __init__(self, tt_size=1 << 16, tt_replace=DEPTH, ordering=True, symmetry=False, heuristics=('v1', 'v2'),
+                 incremental=True, check_eval=False, workers=1, eval_by_depth_agregate=None, book=None, tt_path=None, solve_below=None, tactics=False, mcts_c=1.4, mcts_batch=1, seed=None):
+        self.tt = None
+        if tt_path is None and tt_size:
+            self.tt = TranspositionTable(tt_size, tt_replace)
+        self.tt_path = tt_path
+        self.tt_size = tt_size
+        self.tt_replace = tt_replace
+        self.solve_below = solve_below
+        self.tactics = tactics
+        self.mcts_c = mcts_c
+        self.mcts_batch = mcts_batch
+        self.seed = seed
+        self.mcts = None
+        self.mcts_layout = None
+        self.mcts_pool = None
+        # proven results, kept between searches
+        self.solver_cache = {}
+        self.ordering = ordering
+        self.symmetry = symmetry
+        self.heuristic_names = tuple(heuristics)
+        self.incremental = incremental
+        self.check_eval = check_eval
+        self.workers = workers
+        self.parallel = None
+        # optional dict the searcher adds its eval counts by depth to
+        self.eval_by_depth_agregate = eval_by_depth_agregate
+        self.book = book
+        self.layout = None
+        self.board = None
+        self.evaluator = None
+        self.searcher = None
+
+    def close(self):
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+        if self.mcts_pool is not None:
+            self.mcts_pool.close()
+            self.mcts_pool = None
+        if self.book is not None:
+            self.book.close()
+        if self.tt is not None:
+            self.tt.close()
+
+    def heuristic(self, name):
+        if self.evaluator is not None and name in self.evaluator.heuristics:
+            return self.evaluator.heuristics[name]
+        return HEURISTICS[name]
+
+    def prepare(self, position, heuristic='v1'):
+        # sets the engine's board to position and returns its Searcher, the
+        # board and its watchers are only rebuilt for a new bloc layout
+        layout = position.layout()
+        if layout != self.layout:
+            if self.tt_path is not None:
+                self.open_table(position)
+            board = Board(position.n, position.s, position.blocks)
+            self.layout = layout
+            self.board = board
+            self.evaluator = None
+            if self.incremental:
+                self.evaluator = IncrementalEvaluator(board, self.heuristic_names, check=self.check_eval)
+            orderer = make_orderer(board, self.ordering, self.tactics)
+            symmetry = Symmetry(board) if self.symmetry else None
+            self.searcher = Searcher(board, eval_by_depth_agregate=self.eval_by_depth_agregate,
+                                     tt=self.tt, orderer=orderer, symmetry=symmetry)
+        self.set_pieces(position)
+        self.searcher.set_heuristic(self.heuristic(heuristic), heuristic)
+        return self.searcher
+
+    def open_table(self, position):
+        # the mapped table only holds one n and s, see table_config()
+        config = table_config(position.n, position.s, self.heuristic_names)
+        if self.tt is None:
+            self.tt = MappedTranspositionTable(self.tt_path, self.tt_size, self.tt_replace, config)
+        elif self.tt.config != config:
+            raise ValueError(f'the table in {self.tt_path} is for {self.tt.config!r}, not {config!r}')
+
+    def set_pieces(self, position):
+        # only the cells that differ are changed, between two moves of a
+        # game that is one make()
+        board = self.board
+        targets = []
+        for (piece, pieces) in ((WHITE, position.white), (BLACK, position.black)):
+            target = 0
+            for (x, y) in pieces:
+                target |= board.move(x, y)
+            targets.append((piece, target))
+        for (piece, target) in targets:
+            m = board.pieces[piece] & ~target
+            while m:
+                move = m & -m
+                m ^= move
+                board.unmake(move, piece)
+        for (piece, target) in targets:
+            m = target & ~board.pieces[piece]
+            while m:
+                move = m & -m
+                m ^= move
+                board.make(move, piece)
+
+    def deadline(self, seconds, limits):
+        # a Deadline in seconds (None for none) that limits.stop can end early
+        deadline = Deadline(seconds if seconds is not None else float('inf'))
+        if limits.stop is not None:
+            deadline = StopSignal(deadline, limits.stop)
+        return deadline
+
+    def search(self, position, limits=None, algo='alphabeta', heuristic='v1'):
+        if algo not in self.ALGOS:
+            raise ValueError(f'unknown search algorithm {algo!r}, expected one of {self.ALGOS}')
+        if limits is None:
+            limits = Limits()
+        if self.book is not None:
+            hit = self.book.probe(position, heuristic)
+            if hit is not None:
+                (x, y, value, depth) = hit
+                return SearchResult(value, (x, y), [(x, y)], depth, False, SearchStats(), {}, book=True)
+        searcher = self.prepare(position, heuristic)
+        board = self.board
+        depth = limits.depth
+        if depth is None:
+            depth = bin(board.empty()).count('1')
+        deadline = self.deadline(limits.time, limits)
+        if self.tt is not None:
+            self.tt.reset_stats()
+        searcher.orderer.reset_stats()
+
+        if self.solve_below is not None and bin(board.empty()).count('1') <= self.solve_below:
+            result = self.solve(position, limits)
+            if result is not None:
+                return result
+
+        if algo == 'mcts':
+            return self.search_mcts(position, limits)
+
+        if algo == 'alphabeta' and self.workers > 1:
+            if self.parallel is None:
+                self.parallel = ParallelSearcher(self.workers, tt_path=self.tt_path, tt_config=self.tt.config if self.tt_path is not None else '',
+                                                 ordering=self.ordering, tactics=self.tactics)
+            search = self.parallel
+            # fresh counters so earlier results keep theirs
+            search.stats = SearchStats()
+            search.eval_by_depth = {}
+            if limits.nodes is not None:
+                deadline = NodeBudget(deadline, search.stats, limits.nodes)
+            (value, x, y) = search.iterative(board, depth, max=position.max, deadline=deadline, heuristic=heuristic,
+                                             nodes=limits.nodes)
+        else:
+            search = searcher
+            search.stats = SearchStats()
+            search.eval_by_depth = {}
+            if limits.nodes is not None:
+                deadline = NodeBudget(deadline, search.stats, limits.nodes)
+            (value, x, y) = search.iterative(depth, max=position.max, deadline=deadline, algo=algo)
+
+        return SearchResult(
+            value, None if x is None else (x, y),
+            [board.coords(move) for move in search.pv],
+            search.completed_depth, search.timed_out, search.stats, search.eval_by_depth,
+            self.tt.stats() if self.tt is not None else None,
+            search.orderer.stats() if algo in ('alphabeta', 'pvs') and search.orderer is not None else None)
+
+    def search_mcts(self, position, limits):
+        board = self.board
+        (white, black) = (board.pieces[WHITE], board.pieces[BLACK])
+        piece = BLACK if position.max else WHITE
+        iterations = limits.nodes
+        if limits.time is None and iterations is None:
+            iterations = self.MCTS_PLAYOUTS
+
+        if self.workers > 1:
+            if self.mcts_pool is None:
+                self.mcts_pool = ParallelMCTS(self.workers, self.mcts_c, self.seed, self.mcts_batch)
+            (root_stats, stats, eval_by_depth) = self.mcts_pool.search(
+                position.n, position.s, position.blocks, white, black, piece, limits.time, iterations)
+            (value, move) = best(root_stats, piece)
+            pv = [] if move is None else [move]
+        else:
+            # the tree is only reusable on the same layout
+            if self.mcts is None or self.mcts_layout != position.layout():
+                self.mcts = MCTS(position.n, position.s, position.blocks, self.mcts_c, self.seed, self.mcts_batch)
+                self.mcts_layout = position.layout()
+            mcts = self.mcts
+            mcts.stats = SearchStats()
+            mcts.set_position(white, black, piece)
+            deadline = None
+            if limits.time is not None or limits.stop is not None:
+                deadline = self.deadline(limits.time, limits)
+            root_stats = mcts.search(deadline, iterations)
+            (value, move) = best(root_stats, piece)
+            (stats, eval_by_depth, pv) = (mcts.stats, mcts.eval_by_depth, mcts.principal_variation())
+
+        if self.eval_by_depth_agregate is not None:
+            for (depth, count) in eval_by_depth.items():
+                self.eval_by_depth_agregate[depth] = self.eval_by_depth_agregate.get(depth, 0) + count
+        return SearchResult(value, None if move is None else board.coords(move), [board.coords(m) for m in pv],
+                            stats.depth, False, stats, eval_by_depth)
+
+    def solve(self, position, limits):
+        # the proven result on the engine's board, or None if the solver got
+        # less than half the time limit and didn't finish in it
+        board = self.board
+        solver = Solver(board, self.solver_cache)
+        deadline = self.deadline(limits.time / 2 if limits.time is not None else None, limits)
+        if limits.nodes is not None:
+            deadline = NodeBudget(deadline, solver.stats, limits.nodes)
+        snapshot = board.snapshot()
+        try:
+            (value, move) = solver.solve(position.max, deadline)
+        except TimeoutError:
+            board.restore(snapshot)
+            return None
+        # no move on a board that is already won or full
+        pv = [board.coords(m) for m in solver.principal_variation(position.max)]
+        return SearchResult(value, None if move is None else board.coords(move), pv, solver.stats.depth, False, solver.stats, {}, solved=True)
+
+
+def search(position, limits=None, algo='alphabeta', heuristic='v1', **options):
+    # one-off search with a throwaway Engine, options go to Engine()
+    engine = Engine(heuristics=(heuristic,), **options)
+    try:
+        return engine.search(position, limits, algo, heuristic)
+    finally:
+        engine.close()
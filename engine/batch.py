@@ -0,0 +1,149 @@
+# Batched NumPy kernels.
+#
+# Everything here takes a stack of boards as one (k, n, n) int8 array, laid
+# out like Game.current_state (states[i][x][y] is □ 0, ◦ 1, • 2, ⊠ 3), and
+# works on all k boards with a handful of array operations, so the
+# interpreter overhead is paid once per call instead of once per board:
+# - win_status: the Board.winner() of every board;
+# - legal_moves: the empty cells of every board;
+# - heuristic_v1/v2/windows: the heuristics.HEURISTICS values;
+# - playouts: one uniformly random game to the end from every board.
+#
+# Windows run over the whole board whatever the blocs, a bloc just makes a
+# window unusable, so the bloc free Geometry of an (n, s) serves every bloc
+# layout.
+
+import numpy as np
+
+from .board import EMPTY, WHITE, BLACK, BLOC
+from .geometry import geometry
+from .heuristics import window_scores
+
+TIE = -1
+NONE = 0
+
+
+def tables(n, s):
+    # (windows, last, diagonals): (w, s) flat cell indices x * n + y of every
+    # window, the x = n - 1 line as an (n * n,) 0/1 array and the number of
+    # heuristic_v2 diagonals through every cell
+    return geometry(n, s).flat
+
+
+def stack(boards):
+    # (k, n, n) int8 array of Boards of the same n
+    boards = list(boards)
+    n = boards[0].n
+    states = np.zeros((len(boards), n, n), dtype=np.int8)
+    for (i, board) in enumerate(boards):
+        for piece in (WHITE, BLACK, BLOC):
+            m = board.pieces[piece]
+            while m:
+                move = m & -m
+                m ^= move
+                (x, y) = board.coords(move)
+                states[i, x, y] = piece
+    return states
+
+
+def counts(states):
+    # ◦ minus • pieces, per cell, as (k, n * n) int64
+    flat = states.reshape(len(states), -1)
+    return (flat == WHITE).astype(np.int64) - (flat == BLACK)
+
+
+def win_status(states, s):
+    # (k,) int8: WHITE or BLACK for a line of s, TIE for a full board,
+    # NONE (0) otherwise. ◦ is checked first, like Board.winner()
+    (k, n, _) = states.shape
+    (windows, _, _) = tables(n, s)
+    flat = states.reshape(k, -1)
+    cells = flat[:, windows]
+    white = (cells == WHITE).all(axis=2).any(axis=1)
+    black = (cells == BLACK).all(axis=2).any(axis=1)
+    full = (flat != EMPTY).all(axis=1)
+    status = np.where(full, TIE, NONE).astype(np.int8)
+    status[black] = BLACK
+    status[white] = WHITE
+    return status
+
+
+def legal_moves(states, s=None):
+    # (k, n, n) bool of the empty cells, with s only on boards still in play
+    legal = states == EMPTY
+    if s is not None:
+        legal &= (win_status(states, s) == NONE)[:, None, None]
+    return legal
+
+
+def heuristic_v1(states, s):
+    n = states.shape[1]
+    (_, last, _) = tables(n, s)
+    c = counts(states)
+    h1 = c.sum(axis=1)
+    h2 = n * (c @ last)
+    return h1 ** 3 + h2 ** 3
+
+
+def heuristic_v2(states, s):
+    n = states.shape[1]
+    (_, last, diagonals) = tables(n, s)
+    c = counts(states)
+    h1 = c.sum(axis=1)
+    h2 = n * (c @ last)
+    h3 = c @ diagonals
+    return h1 ** 3 + h2 ** 3 + h3 ** 3
+
+
+def heuristic_windows(states, s):
+    (k, n, _) = states.shape
+    (windows, _, _) = tables(n, s)
+    if not len(windows):
+        return np.zeros(k, dtype=np.int64)
+    # ◦ = 1 and • = s + 1 like heuristics.window_scores, a bloc adds more
+    # than any window of pieces can so its window lands on a zero score
+    bloc = (s + 1) * (s + 1)
+    scores = np.zeros(s * bloc + 1, dtype=np.int64)
+    table = window_scores(s)
+    scores[:len(table)] = table
+    values = np.array([0, 1, s + 1, bloc], dtype=np.int64)
+    sums = values[states.reshape(k, -1)][:, windows].sum(axis=2)
+    return scores[sums].sum(axis=1)
+
+
+HEURISTICS = {
+    'v1': heuristic_v1,
+    'v2': heuristic_v2,
+    'windows': heuristic_windows,
+}
+
+
+def playouts(states, s, piece, rng=None):
+    # (k,) int8 winners of one random game from every board, piece moving
+    # first. The moves are a random order of the empty cells, so a board
+    # goes to whoever completes a window at the earlier move
+    if rng is None:
+        rng = np.random.default_rng()
+    (k, n, _) = states.shape
+    (windows, _, _) = tables(n, s)
+    flat = states.reshape(k, -1)
+    empty = flat == EMPTY
+
+    priority = rng.random(flat.shape)
+    priority[~empty] = 2
+    order = np.argsort(priority, axis=1)
+    turn = np.empty_like(order)
+    np.put_along_axis(turn, order, np.arange(flat.shape[1]), axis=1)
+    other = BLACK if piece == WHITE else WHITE
+    colour = np.where(empty, np.where(turn % 2 == 0, piece, other), flat)
+    turn = np.where(empty, turn, -1)
+
+    never = flat.shape[1]
+    cells = colour[:, windows]
+    done = turn[:, windows].max(axis=2)
+    white = np.where((cells == WHITE).all(axis=2), done, never).min(axis=1)
+    black = np.where((cells == BLACK).all(axis=2), done, never).min(axis=1)
+    winners = np.full(k, TIE, dtype=np.int8)
+    winners[white < black] = WHITE
+    winners[black < white] = BLACK
+    return winners
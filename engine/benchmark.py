@@ -0,0 +1,418 @@
+# Reproducible search benchmark.
+#
+# A fixed corpus of positions (n = 3..10, a few s per n, no blocs / corner
+# blocs / random blocs, a few random pieces already played) is generated from
+# a seed, and every engine makes one move decision on each position under the
+# same depth and time limits. The report has nodes per second, the time each
+# iterative deepening depth took to finish and move decision latency
+# percentiles, and can be saved as JSON and compared with a saved baseline:
+#
+#     python -m engine.benchmark --save out/bench-base.json
+#     ... change something ...
+#     python -m engine.benchmark --compare out/bench-base.json
+#
+# --alloc measures memory instead: the tracemalloc peak of a decision, the
+# allocated blocks (sys.getallocatedblocks()) above the start of the search
+# sampled at every interior node, and the blocks a decision left allocated.
+# CPython keeps no count of allocations that are freed again, the samples
+# see what the nodes on the current path hold:
+#
+#     python -m engine.benchmark --alloc --engines minimax alphabeta
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from timeout import Deadline
+
+from .board import Board, WHITE, BLACK, BLOC
+from .evaluator import IncrementalEvaluator
+from .mcts import MCTS, best
+from .ordering import MoveOrderer, TacticalOrderer
+from .parallel import ParallelSearcher
+from .search import Searcher
+from .symmetry import Symmetry
+from .transposition import TranspositionTable
+
+LAYOUTS = ('none', 'corners', 'random')
+
+# deepest iteration per board size, the time limit usually stops the big ones first
+DEPTHS = {3: 9, 4: 6, 5: 5, 6: 4, 7: 4, 8: 3, 9: 3, 10: 3}
+
+
+def layout_blocks(layout, n, rng):
+    if layout == 'corners':
+        return [(0, 0), (0, n - 1), (n - 1, 0), (n - 1, n - 1)]
+    if layout == 'random':
+        cells = [(x, y) for x in range(n) for y in range(n)]
+        return sorted(rng.sample(cells, n // 2))
+    return []
+
+
+def make_corpus(seed=2083, sizes=range(3, 11)):
+    # list of positions: dicts with n, s, layout, blocks, white and black
+    # (lists of (x, y)) and max (True when • is to move)
+    rng = random.Random(seed)
+    corpus = []
+    for n in sizes:
+        for s in sorted({3, (3 + n) // 2, n}):
+            for layout in LAYOUTS:
+                blocks = layout_blocks(layout, n, rng)
+                while True:
+                    board = Board(n, s, blocks)
+                    pieces = {WHITE: [], BLACK: []}
+                    moves = list(board.empty_moves())
+                    rng.shuffle(moves)
+                    for (i, move) in enumerate(moves[:rng.randrange(0, n)]):
+                        piece = WHITE if i % 2 == 0 else BLACK
+                        board.make(move, piece)
+                        pieces[piece].append(board.coords(move))
+                    if board.winner() is None:
+                        break
+                corpus.append({
+                    'n': n, 's': s, 'layout': layout, 'blocks': blocks,
+                    'white': pieces[WHITE], 'black': pieces[BLACK],
+                    'max': len(pieces[WHITE]) > len(pieces[BLACK]),
+                })
+    return corpus
+
+
+def build_board(position):
+    board = Board(position['n'], position['s'], position['blocks'])
+    for (piece, cells) in ((WHITE, position['white']), (BLACK, position['black'])):
+        for (x, y) in cells:
+            board.make(board.move(x, y), piece)
+    return board
+
+
+def searcher_engine(algo, tt=False, ordering=False, symmetry=False, tactics=False):
+    # every decision starts from a fresh table so positions don't help each other
+    def run(board, depth, max, deadline, heuristic):
+        evaluator = IncrementalEvaluator(board, (heuristic,))
+        searcher = Searcher(
+            board, evaluator.heuristics[heuristic],
+            tt=TranspositionTable(1 << 16) if tt else None,
+            orderer=TacticalOrderer(board) if tactics else MoveOrderer(board) if ordering else None,
+            symmetry=Symmetry(board) if symmetry else None)
+        searcher.set_heuristic(evaluator.heuristics[heuristic], heuristic)
+        result = searcher.iterative(depth, max=max, deadline=deadline, algo=algo)
+        return (result, searcher.stats)
+    return run
+
+
+def mcts_engine(batch=1):
+    def run(board, depth, max, deadline, heuristic):
+        # anytime, runs for the whole time limit whatever the depth
+        blocks = []
+        m = board.pieces[BLOC]
+        while m:
+            move = m & -m
+            m ^= move
+            blocks.append(board.coords(move))
+        mcts = MCTS(board.n, board.s, blocks, seed=0, batch=batch)
+        piece = BLACK if max else WHITE
+        mcts.set_position(board.pieces[WHITE], board.pieces[BLACK], piece)
+        (value, move) = best(mcts.search(deadline), piece)
+        if move is None:
+            return ((None, None, None), mcts.stats)
+        return ((value, *board.coords(move)), mcts.stats)
+    return run
+
+
+class ParallelEngine:
+    """
+    ParallelSearcher with one pool kept for the whole benchmark.
+    """
+
+    def __init__(self, workers):
+        self.searcher = ParallelSearcher(workers)
+
+    def __call__(self, board, depth, max, deadline, heuristic):
+        result = self.searcher.iterative(board, depth, max=max, deadline=deadline, heuristic=heuristic)
+        return (result, self.searcher.stats)
+
+    def close(self):
+        self.searcher.close()
+
+
+ENGINES = {
+    'minimax': lambda options: searcher_engine('minimax'),
+    'alphabeta': lambda options: searcher_engine('alphabeta'),
+    'alphabeta-tt': lambda options: searcher_engine('alphabeta', tt=True, ordering=True),
+    'alphabeta-symmetry': lambda options: searcher_engine('alphabeta', tt=True, ordering=True, symmetry=True),
+    'alphabeta-tactics': lambda options: searcher_engine('alphabeta', tt=True, ordering=True, tactics=True),
+    'pvs': lambda options: searcher_engine('pvs', tt=True, ordering=True),
+    'mcts': lambda options: mcts_engine(),
+    'mcts-batch': lambda options: mcts_engine(batch=32),
+    'parallel': lambda options: ParallelEngine(options.workers),
+}
+
+# parallel needs a process pool and mcts always uses the whole time limit,
+# they only run when asked for
+DEFAULT_ENGINES = ('minimax', 'alphabeta', 'alphabeta-tt', 'alphabeta-symmetry', 'alphabeta-tactics', 'pvs')
+
+
+def percentile(values, p):
+    # nearest rank
+    if not values:
+        return 0
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def run_engine(engine, corpus, time_limit, heuristic):
+    decisions = []
+    for position in corpus:
+        board = build_board(position)
+        depth = DEPTHS[position['n']]
+        (result, stats) = engine(board, depth, position['max'], Deadline(time_limit), heuristic)
+        decisions.append({
+            'result': list(result),
+            'nodes': stats.total_nodes(),
+            'elapsed': stats.elapsed,
+            'depth': stats.depth,
+            'depth_times': list(stats.depth_times),
+            'researches': stats.researches,
+            'aspiration_researches': stats.aspiration_researches,
+        })
+    return decisions
+
+
+def summarize(corpus, decisions):
+    nodes = sum(d['nodes'] for d in decisions)
+    elapsed = sum(d['elapsed'] for d in decisions)
+    latencies = [d['elapsed'] for d in decisions]
+
+    time_to_depth = {}
+    for d in decisions:
+        for (i, t) in enumerate(d['depth_times']):
+            time_to_depth.setdefault(i + 1, []).append(t)
+
+    nps_by_n = {}
+    for (position, d) in zip(corpus, decisions):
+        (count, seconds) = nps_by_n.get(position['n'], (0, 0))
+        nps_by_n[position['n']] = (count + d['nodes'], seconds + d['elapsed'])
+
+    return {
+        'positions': len(decisions),
+        'nodes': nodes,
+        'elapsed': elapsed,
+        'nodes_per_second': nodes / elapsed if elapsed else 0,
+        'nodes_per_second_by_n': {str(n): (c / t if t else 0) for (n, (c, t)) in sorted(nps_by_n.items())},
+        'latency': {
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies, default=0),
+        },
+        # mean time to finish depth d over the positions that got there
+        'time_to_depth': {str(d): {'mean': sum(ts) / len(ts), 'reached': len(ts)} for (d, ts) in sorted(time_to_depth.items())},
+        'average_depth': sum(d['depth'] for d in decisions) / len(decisions) if decisions else 0,
+        'researches': sum(d['researches'] for d in decisions),
+        'aspiration_researches': sum(d['aspiration_researches'] for d in decisions),
+        'decisions': decisions,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_benchmark(engines=DEFAULT_ENGINES, seed=2083, sizes=range(3, 11), time_limit=0.5, heuristic='windows', workers=2, log=None):
+    options = argparse.Namespace(workers=workers)
+    corpus = make_corpus(seed, sizes)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'settings': {
+            'seed': seed,
+            'sizes': list(sizes),
+            'time': time_limit,
+            'heuristic': heuristic,
+            'depths': {str(n): DEPTHS[n] for n in sizes},
+        },
+        'engines': {},
+    }
+    for name in engines:
+        engine = ENGINES[name](options)
+        try:
+            decisions = run_engine(engine, corpus, time_limit, heuristic)
+        finally:
+            if hasattr(engine, 'close'):
+                engine.close()
+        report['engines'][name] = summarize(corpus, decisions)
+        if log:
+            log(format_engine(name, report['engines'][name]))
+    return report
+
+
+def format_engine(name, summary):
+    latency = summary['latency']
+    depths = ', '.join(f'd{d} {v["mean"] * 1000:.1f}ms ({v["reached"]})' for (d, v) in summary['time_to_depth'].items())
+    text = (f'{name}: {summary["positions"]} positions, {summary["nodes"]} nodes, '
+            f'{summary["nodes_per_second"]:.0f} nodes/s, average depth {summary["average_depth"]:.2f}\n'
+            f'    latency p50 {latency["p50"] * 1000:.1f}ms p90 {latency["p90"] * 1000:.1f}ms '
+            f'p99 {latency["p99"] * 1000:.1f}ms max {latency["max"] * 1000:.1f}ms\n'
+            f'    time to depth: {depths}')
+    if summary.get('researches') or summary.get('aspiration_researches'):
+        text += f'\n    re-searches: {summary["researches"]} null window, {summary["aspiration_researches"]} aspiration'
+    return text
+
+
+def change(old, new):
+    if not old:
+        return 'n/a'
+    return f'{(new - old) / old:+.1%}'
+
+
+def compare(baseline, report):
+    # text diff of two reports, engine by engine
+    lines = []
+    if baseline['settings'] != report['settings']:
+        lines.append('warning: settings differ, numbers are not comparable')
+    lines.append(f'baseline {baseline["meta"].get("commit") or "?"} -> current {report["meta"].get("commit") or "?"}')
+    for (name, new) in report['engines'].items():
+        old = baseline['engines'].get(name)
+        if old is None:
+            lines.append(f'{name}: not in baseline')
+            continue
+        lines.append(f'{name}:')
+        lines.append(f'    nodes/s {old["nodes_per_second"]:.0f} -> {new["nodes_per_second"]:.0f} ({change(old["nodes_per_second"], new["nodes_per_second"])})')
+        for p in ('p50', 'p90', 'p99', 'max'):
+            (a, b) = (old['latency'][p], new['latency'][p])
+            lines.append(f'    latency {p} {a * 1000:.1f}ms -> {b * 1000:.1f}ms ({change(a, b)})')
+        for (d, v) in new['time_to_depth'].items():
+            if d in old['time_to_depth']:
+                a = old['time_to_depth'][d]
+                lines.append(f'    depth {d} {a["mean"] * 1000:.1f}ms ({a["reached"]}) -> {v["mean"] * 1000:.1f}ms ({v["reached"]}) ({change(a["mean"], v["mean"])})')
+        # positions searched to the same depth should pick the same move
+        changed = sum(1 for (a, b) in zip(old['decisions'], new['decisions'])
+                      if a['depth'] == b['depth'] and a['result'] != b['result'])
+        if changed:
+            lines.append(f'    {changed} decisions changed at equal depth')
+    return '\n'.join(lines)
+
+
+class BlockProbe:
+    """
+    Deadline that samples sys.getallocatedblocks() on every check, which
+    searches do at every interior node, above the count at the first one so
+    what the engine set up before searching doesn't count.
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.start = None
+        self.samples = 0
+        self.total = 0
+        self.max = 0
+
+    def sample(self):
+        blocks = sys.getallocatedblocks()
+        if self.start is None:
+            self.start = blocks
+        held = blocks - self.start
+        self.samples += 1
+        self.total += held
+        if held > self.max:
+            self.max = held
+
+    def elapsed(self):
+        return self.deadline.elapsed()
+
+    def remaining(self):
+        return self.deadline.remaining()
+
+    def expired(self):
+        self.sample()
+        return self.deadline.expired()
+
+    def check(self):
+        self.sample()
+        self.deadline.check()
+
+
+def run_allocations(engines, seed=2083, sizes=range(3, 11), time_limit=0.5, heuristic='windows', workers=2, log=None):
+    # {engine: {nodes, peak, held, max_held, retained}}: the largest
+    # tracemalloc peak of one decision in bytes, the mean and largest number
+    # of blocks held above the first node at a node, and the blocks still
+    # allocated after each decision in total. Parallel workers are other
+    # processes and aren't seen
+    options = argparse.Namespace(workers=workers)
+    corpus = make_corpus(seed, sizes)
+    report = {}
+    for name in engines:
+        engine = ENGINES[name](options)
+        (nodes, peak, samples, held, max_held, retained) = (0, 0, 0, 0, 0, 0)
+        tracemalloc.start()
+        try:
+            for position in corpus:
+                board = build_board(position)
+                (start, _) = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                probe = BlockProbe(Deadline(time_limit))
+                before = sys.getallocatedblocks()
+                (_, stats) = engine(board, DEPTHS[position['n']], position['max'], probe, heuristic)
+                (_, top) = tracemalloc.get_traced_memory()
+                retained += sys.getallocatedblocks() - before
+                nodes += stats.total_nodes()
+                peak = max(peak, top - start)
+                samples += probe.samples
+                held += probe.total
+                max_held = max(max_held, probe.max)
+                del stats
+        finally:
+            tracemalloc.stop()
+            if hasattr(engine, 'close'):
+                engine.close()
+        held = held / samples if samples else 0
+        report[name] = {'nodes': nodes, 'peak': peak, 'held': held, 'max_held': max_held, 'retained': retained}
+        if log:
+            log(f'{name}: {nodes} nodes, peak {peak / 1024:.1f} KiB, {held:.1f} blocks held at a node '
+                f'(at most {max_held}), {retained} blocks left allocated')
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Line em up search benchmark')
+    parser.add_argument('--engines', nargs='+', default=list(DEFAULT_ENGINES), choices=list(ENGINES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(range(3, 11)))
+    parser.add_argument('--seed', type=int, default=2083)
+    parser.add_argument('--time', type=float, default=0.5, help='seconds per move decision')
+    parser.add_argument('--heuristic', default='windows')
+    parser.add_argument('--workers', type=int, default=2, help='processes for the parallel engine')
+    parser.add_argument('--save', help='write the report as JSON')
+    parser.add_argument('--compare', help='JSON report to compare against')
+    parser.add_argument('--alloc', action='store_true', help='measure allocations with tracemalloc instead')
+    args = parser.parse_args(argv)
+
+    if args.alloc:
+        run_allocations(args.engines, args.seed, args.sizes, args.time, args.heuristic, args.workers, log=print)
+        return
+
+    report = run_benchmark(args.engines, args.seed, args.sizes, args.time, args.heuristic, args.workers, log=print)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(compare(baseline, report))
+
+
+if __name__ == '__main__':
+    main()
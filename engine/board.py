@@ -0,0 +1,171 @@
+# Bitboard representation of a Line 'em Up board.
+#
+# Cell (x, y) maps to bit x * (n + 1) + y. Every row gets one extra guard bit
+# that is never set, so shifting a mask along a line can't wrap around into
+# the next row. With n <= 10 a mask needs at most 110 bits.
+
+from .geometry import geometry
+from .zobrist import zobrist_keys
+
+EMPTY = 0
+WHITE = 1
+BLACK = 2
+BLOC = 3
+
+
+def bit_index(move):
+    return move.bit_length() - 1
+
+
+class Board:
+    """
+    White, black and bloc cells stored as integer bitmasks.
+    Moves are single-bit masks, see Board.move() and Board.coords().
+    """
+
+    def __init__(self, n, s, blocks=()):
+        self.n = n
+        self.s = s
+        # shared with every board of the same (n, s, blocks)
+        self.geometry = geometry(n, s, blocks)
+        self.stride = n + 1
+        # shifts for the four lines through a cell: along y, along x,
+        # diagonal (x+1, y+1) and anti-diagonal (x+1, y-1)
+        self.directions = self.geometry.directions
+        self.full = self.geometry.full
+
+        # indexed by cell value, pieces[EMPTY] is unused
+        self.pieces = [0, 0, 0, 0]
+        self.zobrist = zobrist_keys(n)
+        self.key = 0
+        # objects with place/remove/reset that follow every change, see
+        # evaluator.IncrementalEvaluator
+        self.watchers = ()
+        for (x, y) in blocks:
+            self.make(self.move(x, y), BLOC)
+
+    def move(self, x, y):
+        return 1 << (x * self.stride + y)
+
+    def coords(self, move):
+        return divmod(bit_index(move), self.stride)
+
+    def cell(self, x, y):
+        m = self.move(x, y)
+        for piece in (WHITE, BLACK, BLOC):
+            if self.pieces[piece] & m:
+                return piece
+        return EMPTY
+
+    def occupied(self):
+        pieces = self.pieces
+        return pieces[WHITE] | pieces[BLACK] | pieces[BLOC]
+
+    def empty(self):
+        return self.full & ~self.occupied()
+
+    def empty_moves(self):
+        # lowest bit first, which is the same row-major order as looping
+        # for x in range(n): for y in range(n)
+        moves = []
+        m = self.empty()
+        while m:
+            low = m & -m
+            moves.append(low)
+            m ^= low
+        return moves
+
+    def make(self, move, piece):
+        self.pieces[piece] |= move
+        self.key ^= self.zobrist[piece][move]
+        for watcher in self.watchers:
+            watcher.place(move, piece)
+
+    def unmake(self, move, piece):
+        self.pieces[piece] &= ~move
+        self.key ^= self.zobrist[piece][move]
+        for watcher in self.watchers:
+            watcher.remove(move, piece)
+
+    def snapshot(self):
+        return (tuple(self.pieces), self.key)
+
+    def restore(self, snapshot):
+        (pieces, self.key) = snapshot
+        self.pieces = list(pieces)
+        for watcher in self.watchers:
+            watcher.reset()
+
+    def has_line(self, mask):
+        s = self.s
+        for d in self.directions:
+            # after each step a bit survives only if it starts a run of
+            # `length` set bits along d, doubling the run length each time
+            m = mask
+            length = 1
+            while m and length < s:
+                step = min(length, s - length)
+                m &= m >> (d * step)
+                length += step
+            if m:
+                return True
+        return False
+
+    def winning_cells(self, piece):
+        # mask of the empty cells where piece would complete s in a row: for
+        # every split of the other s - 1 cells into a before and s - 1 - a
+        # after the cell along a line, runs[a] and backs[s - 1 - a] mark the
+        # cells with that many pieces in a row behind and ahead of them
+        mask = self.pieces[piece]
+        s = self.s
+        if bin(mask).count('1') < s - 1:
+            return 0
+        cells = 0
+        for d in self.directions:
+            runs = [-1]
+            backs = [-1]
+            for j in range(1, s):
+                runs.append(runs[-1] & (mask << (d * j)))
+                backs.append(backs[-1] & (mask >> (d * j)))
+            for a in range(s):
+                cells |= runs[a] & backs[s - 1 - a]
+        return cells & self.empty()
+
+    def wins_at(self, move, piece):
+        # only walks the four lines through move, out to distance s - 1.
+        # Guard bits and the ends of the mask stop the walk at the edges.
+        mask = self.pieces[piece]
+        s = self.s
+        for d in self.directions:
+            count = 1
+            m = move << d
+            while count < s and mask & m:
+                count += 1
+                m <<= d
+            m = move >> d
+            while count < s and mask & m:
+                count += 1
+                m >>= d
+            if count >= s:
+                return True
+        return False
+
+    # same as winner(), but assumes the position was not won before piece
+    # played move
+    def winner_at(self, move, piece):
+        if self.wins_at(move, piece):
+            return piece
+        if self.occupied() == self.full:
+            return -1
+        return None
+
+    # full board check, the reference for winner_at()
+    # returns 1 for white win, 2 for black win, -1 for tie and None when game isn't done
+    def winner(self):
+        if self.has_line(self.pieces[WHITE]):
+            return WHITE
+        if self.has_line(self.pieces[BLACK]):
+            return BLACK
+        if self.occupied() == self.full:
+            return -1
+        return None
@@ -0,0 +1,252 @@
+# Opening book.
+#
+# Best moves for the first plies of a game, searched offline. A book holds one
+# (n, s) and the heuristic it was searched with, and only answers searches
+# with that heuristic: positions with any bloc layout can share it since blocs
+# are part of the Zobrist key. With a symmetric heuristic (see
+# heuristics.SYMMETRIC) keys are canonical (see symmetry.Symmetry), so one
+# entry covers every rotation and reflection of a position. Other heuristics
+# give those positions other values, so their books key every position as it
+# is.
+#
+# File layout, little endian:
+#     header  b'LEMBOOK2', n, s, plies (deepest ply in the book), count, heuristic
+#     records (key, value, x, y, depth) sorted by key, move in the canonical frame
+# The file is memory mapped on the first probe and searched in place, so
+# opening a book costs nothing until it is used.
+#
+#     python -m engine.book build books --n 8 --s 5 --plies 2 --depth 6 --time 10
+#     python -m engine.book extend books --n 8 --s 5 --plies 3 --depth 6 --time 10 --blocks 0,0 7,7
+#     python -m engine.book show books --n 8 --s 5
+
+import argparse
+import mmap
+import os
+import struct
+
+from .api import Engine, Position, Limits
+from .board import WHITE, BLACK
+from .heuristics import SYMMETRIC
+from .symmetry import Symmetry
+from .zobrist import SIDE
+
+MAGIC = b'LEMBOOK2'
+HEADER = struct.Struct('<8sBBHI16s')
+RECORD = struct.Struct('<QdBBB')
+
+
+def book_path(directory, n, s):
+    return os.path.join(directory, f'book-{n}-{s}.bin')
+
+
+def canonical(position, fold=True):
+    # (key, frame, symmetry, board) for a position, the key includes the
+    # side to move. fold=False keys the position as it is, frame 0 is the
+    # identity
+    board = position.to_board()
+    symmetry = Symmetry(board, follow=False)
+    if fold:
+        (key, frame) = symmetry.canonical()
+    else:
+        (key, frame) = (symmetry.keys[0], 0)
+    if position.max:
+        key ^= SIDE
+    return (key, frame, symmetry, board)
+
+
+class OpeningBook:
+    """
+    Read only view of a book file, opened lazily.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.data = None
+        self.n = None
+        self.s = None
+        self.plies = None
+        self.count = 0
+        self.heuristic = None
+
+    @classmethod
+    def for_config(cls, directory, n, s):
+        # the book for (n, s) in directory, or None if there isn't one
+        path = book_path(directory, n, s)
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def open(self):
+        if self.file is not None:
+            return
+        self.file = open(self.path, 'rb')
+        header = self.file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f'{self.path} is not an opening book')
+        (magic, self.n, self.s, self.plies, self.count, heuristic) = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f'{self.path} is not an opening book')
+        self.heuristic = heuristic.rstrip(b'\0').decode()
+        if self.count:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def record(self, i):
+        return RECORD.unpack_from(self.data, HEADER.size + i * RECORD.size)
+
+    def find(self, key):
+        # binary search over the sorted records
+        (lo, hi) = (0, self.count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self.record(mid)
+            if record[0] < key:
+                lo = mid + 1
+            elif record[0] > key:
+                hi = mid
+            else:
+                return record
+        return None
+
+    def records(self):
+        self.open()
+        return [self.record(i) for i in range(self.count)]
+
+    def probe(self, position, heuristic):
+        # (x, y, value, depth) of the book move for position, or None, also
+        # when the book was searched with another heuristic
+        self.open()
+        if not self.count or (position.n, position.s, heuristic) != (self.n, self.s, self.heuristic):
+            return None
+        if len(position.white) + len(position.black) >= self.plies:
+            return None
+        (key, frame, symmetry, board) = canonical(position, heuristic in SYMMETRIC)
+        record = self.find(key)
+        if record is None:
+            return None
+        (_, value, x, y, depth) = record
+        move = symmetry.from_canonical(board.move(x, y), frame)
+        if not move & board.empty():
+            # a key collision, ignore it
+            return None
+        return (*board.coords(move), value, depth)
+
+
+def write_book(path, n, s, plies, heuristic, entries):
+    # entries is {key: (value, x, y, depth)}
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, n, s, plies, len(entries), heuristic.encode()))
+        for key in sorted(entries):
+            f.write(RECORD.pack(key, *entries[key]))
+
+
+def build(directory, n, s, layouts, plies, depth, time=None, heuristic='v2', extend=True, log=None):
+    # searches every position with fewer than plies pieces reachable from the
+    # empty boards of layouts, keeping entries already searched at least as
+    # deep when extend is set. A book only holds one heuristic, extending it
+    # with another is an error
+    os.makedirs(directory, exist_ok=True)
+    path = book_path(directory, n, s)
+    fold = heuristic in SYMMETRIC
+    entries = {}
+    old_plies = 0
+    if extend and os.path.exists(path):
+        book = OpeningBook(path)
+        book.open()
+        if book.heuristic != heuristic:
+            book.close()
+            raise ValueError(f'{path} was searched with {book.heuristic!r}, not {heuristic!r}')
+        old_plies = book.plies
+        entries = {key: (value, x, y, d) for (key, value, x, y, d) in book.records()}
+        book.close()
+
+    engine = Engine(heuristics=(heuristic,))
+    searched = 0
+    try:
+        for blocks in layouts:
+            seen = set()
+            frontier = [Position(n, s, blocks)]
+            for ply in range(plies):
+                children = []
+                for position in frontier:
+                    (key, frame, symmetry, board) = canonical(position, fold)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if board.winner() is not None:
+                        continue
+                    entry = entries.get(key)
+                    if entry is None or entry[3] < depth:
+                        result = engine.search(position, Limits(depth=depth, time=time), heuristic=heuristic)
+                        searched += 1
+                        if result.move is not None:
+                            (x, y) = board.coords(symmetry.to_canonical(board.move(*result.move), frame))
+                            entries[key] = (result.value, x, y, result.depth)
+                    if ply + 1 < plies:
+                        piece = BLACK if position.max else WHITE
+                        for move in board.empty_moves():
+                            cell = board.coords(move)
+                            if piece == WHITE:
+                                children.append(Position(n, s, blocks, position.white + [cell], position.black, True))
+                            else:
+                                children.append(Position(n, s, blocks, position.white, position.black + [cell], False))
+                if log:
+                    log(f'layout {blocks}: ply {ply}, {len(entries)} entries, {searched} searched')
+                frontier = children
+    finally:
+        engine.close()
+
+    write_book(path, n, s, max(plies, old_plies), heuristic, entries)
+    return path
+
+
+def parse_cell(text):
+    (x, y) = text.split(',')
+    return (int(x), int(y))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build and inspect opening books')
+    parser.add_argument('command', choices=('build', 'extend', 'show'))
+    parser.add_argument('directory')
+    parser.add_argument('--n', type=int, required=True)
+    parser.add_argument('--s', type=int, required=True)
+    parser.add_argument('--blocks', nargs='*', type=parse_cell, default=[], help='bloc cells as x,y')
+    parser.add_argument('--corners', action='store_true', help='also build for blocs in the four corners')
+    parser.add_argument('--plies', type=int, default=2)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--time', type=float, default=None, help='seconds per position')
+    parser.add_argument('--heuristic', default='v2')
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        book = OpeningBook.for_config(args.directory, args.n, args.s)
+        if book is None:
+            print('no book')
+            return
+        records = book.records()
+        print(f'{book.path}: n={book.n} s={book.s} plies={book.plies} heuristic={book.heuristic} entries={book.count}')
+        for (key, value, x, y, depth) in records:
+            print(f'{key:016x} x={x} y={y} value={value} depth={depth}')
+        book.close()
+        return
+
+    layouts = [args.blocks]
+    if args.corners:
+        m = args.n - 1
+        layouts.append([(0, 0), (0, m), (m, 0), (m, m)])
+    path = build(args.directory, args.n, args.s, layouts, args.plies, args.depth, args.time,
+                 args.heuristic, extend=args.command == 'extend', log=print)
+    print(f'wrote {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# Incrementally maintained evaluation.
+#
+# The evaluator watches a Board and updates its state on every make/unmake,
+# touching only what contains the cell that changed:
+# - the window heuristic keeps one encoded piece count per winning window
+#   (◦ = 1, • = s + 1, see heuristics.window_scores) and a running score;
+# - heuristic_v1/v2 are cubes of linear piece-count sums, so it keeps the
+#   three sums and cubes them on demand.
+# Every heuristic is then O(1) at the leaves.
+
+from .board import WHITE, BLACK
+from .heuristics import window_scores, HEURISTICS
+
+
+class IncrementalEvaluator:
+    """
+    Running scores for the heuristics named in names (keys of HEURISTICS).
+    With check=True every update is compared with the from-scratch version.
+    """
+
+    def __init__(self, board, names=('v1', 'v2', 'windows'), check=False):
+        self.board = board
+        self.check = check
+        self.track_windows = 'windows' in names
+        self.track_terms = 'v1' in names or 'v2' in names
+        # the tables are shared through the board's Geometry
+        geometry = board.geometry
+        self.scores = window_scores(board.s).tolist()
+        self.windows = geometry.windows
+        self.cell_windows = geometry.cell_windows
+        self.terms = geometry.terms
+
+        heuristics = {
+            'v1': self.heuristic_v1,
+            'v2': self.heuristic_v2,
+            'windows': self.heuristic_windows,
+        }
+        self.heuristics = {name: heuristics[name] for name in names}
+        self.reset()
+        board.watchers += (self,)
+
+    def reset(self):
+        # recount from the board, after a restore()
+        board = self.board
+        self.sums = [0] * len(self.windows)
+        self.score = 0
+        self.h = [0, 0, 0]
+        for piece in (WHITE, BLACK):
+            m = board.pieces[piece]
+            while m:
+                move = m & -m
+                m ^= move
+                self._update(move, piece, 1)
+        if self.check:
+            self.verify()
+
+    def place(self, move, piece):
+        self._update(move, piece, 1)
+        if self.check:
+            self.verify()
+
+    def remove(self, move, piece):
+        self._update(move, piece, -1)
+        if self.check:
+            self.verify()
+
+    def _update(self, move, piece, sign):
+        if self.track_windows:
+            step = sign if piece == WHITE else sign * (self.board.s + 1)
+            sums = self.sums
+            scores = self.scores
+            score = self.score
+            for i in self.cell_windows[move]:
+                old = sums[i]
+                sums[i] = old + step
+                score += scores[old + step] - scores[old]
+            self.score = score
+
+        if self.track_terms:
+            # the linear terms count ◦ positive
+            if piece == BLACK:
+                sign = -sign
+            (t1, t2, t3) = self.terms[move]
+            h = self.h
+            h[0] += sign * t1
+            h[1] += sign * t2
+            h[2] += sign * t3
+
+    def heuristic_v1(self, board=None):
+        (h1, h2, _) = self.h
+        return h1 * h1 * h1 + h2 * h2 * h2
+
+    def heuristic_v2(self, board=None):
+        (h1, h2, h3) = self.h
+        return h1 * h1 * h1 + h2 * h2 * h2 + h3 * h3 * h3
+
+    def heuristic_windows(self, board=None):
+        return self.score
+
+    def verify(self):
+        for (name, heuristic) in self.heuristics.items():
+            expected = HEURISTICS[name](self.board)
+            actual = heuristic()
+            assert actual == expected, f'incremental {name} is {actual}, from scratch {expected}'
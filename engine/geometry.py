@@ -0,0 +1,164 @@
+# Board geometry.
+#
+# Everything that only depends on n, s and the bloc layout: the cells and
+# the lines through them, the winning windows and which of them go through
+# each cell, neighbours, the heuristic_v1/v2 masks, the symmetries the blocs
+# keep and the flat (x * n + y) versions of these for batch.
+# geometry() builds a Geometry once per configuration and keeps the last
+# few in an LRU cache keyed by (n, s, frozenset(blocks)), so a new Board,
+# evaluator, orderer or Game for a layout seen before costs nothing extra.
+#
+# Moves are single-bit masks like Board's, cell (x, y) at bit x * (n + 1) + y.
+# A Geometry is shared, nothing may change it after it is built.
+
+import functools
+
+import numpy as np
+
+# steps along y, along x, the diagonal and the anti-diagonal, in the order of
+# Board.directions
+STEPS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+# configurations kept by geometry()
+CACHE_SIZE = 32
+
+
+class Geometry:
+    """
+    The shape of an n x n board with blocs, for lines of s.
+    """
+
+    def __init__(self, n, s, blocks=frozenset()):
+        self.n = n
+        self.s = s
+        self.blocks = frozenset(blocks)
+        self.stride = n + 1
+        self.directions = (1, n + 1, n + 2, n)
+        self.size = n * n
+        # cells in row-major order, which is also lowest bit first
+        self.cells = [(x, y) for x in range(n) for y in range(n)]
+        self.moves = [self.move(x, y) for (x, y) in self.cells]
+        self.full = sum(self.moves)
+        self.blocs = sum(self.move(x, y) for (x, y) in self.blocks)
+
+        # lines[move] are the whole row, column, diagonal and anti-diagonal
+        # through move, as masks
+        self.lines = {}
+        for (x, y) in self.cells:
+            lines = []
+            for (dx, dy) in STEPS:
+                mask = 0
+                for k in range(-n, n):
+                    (i, j) = (x + k * dx, y + k * dy)
+                    if 0 <= i < n and 0 <= j < n:
+                        mask |= self.move(i, j)
+                lines.append(mask)
+            self.lines[self.move(x, y)] = tuple(lines)
+
+        # every run of s cells with no bloc in it, as bit indices, and the
+        # indices of the windows through every cell without a bloc
+        self.windows = [window for window in self.all_windows() if not any(self.blocs >> bit & 1 for bit in window)]
+        self.cell_windows = {move: [] for move in self.moves if not move & self.blocs}
+        for (i, window) in enumerate(self.windows):
+            for bit in window:
+                self.cell_windows[1 << bit].append(i)
+
+        # heuristic_v1/v2 count their "rows" term over x = n - 1 only, n
+        # times, and walk these diagonals, the main ones twice
+        self.last = sum(self.move(n - 1, y) for y in range(n))
+        self.diagonals = []
+        for i in range(0, n - s + 1):
+            length = n - i
+            self.diagonals.append(sum(self.move(k, k + i) for k in range(length)))
+            self.diagonals.append(sum(self.move(k + i, k) for k in range(length)))
+            self.diagonals.append(sum(self.move(k, n - 1 - k - i) for k in range(length)))
+            self.diagonals.append(sum(self.move(k + i, n - 1 - k) for k in range(length)))
+        # terms[move] is what one piece on move adds to the three heuristic sums
+        self.terms = {}
+        for move in self.moves:
+            diagonal = sum(1 for d in self.diagonals if d & move)
+            self.terms[move] = (1, n if self.last & move else 0, diagonal)
+
+        # king move neighbours, and closeness to the center for ordering
+        c = (n - 1) / 2
+        self.center = {}
+        self.neighbours = {}
+        for (x, y) in self.cells:
+            move = self.move(x, y)
+            self.center[move] = -(abs(x - c) + abs(y - c))
+            mask = 0
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if (dx or dy) and 0 <= x + dx < n and 0 <= y + dy < n:
+                        mask |= self.move(x + dx, y + dy)
+            self.neighbours[move] = mask
+
+    def move(self, x, y):
+        return 1 << (x * self.stride + y)
+
+    def coords(self, move):
+        return divmod(move.bit_length() - 1, self.stride)
+
+    def all_windows(self):
+        n = self.n
+        s = self.s
+        for (dx, dy) in STEPS:
+            for (x, y) in self.cells:
+                cells = [(x + k * dx, y + k * dy) for k in range(s)]
+                if all(0 <= i < n and 0 <= j < n for (i, j) in cells):
+                    yield tuple(i * self.stride + j for (i, j) in cells)
+
+    @functools.cached_property
+    def window_array(self):
+        # windows as a (windows, s) array of bit indices
+        return np.array(self.windows, dtype=np.intp).reshape(-1, self.s)
+
+    @functools.cached_property
+    def symmetries(self):
+        # (perms, inverse): perms[i][move] is where the i-th symmetry of the
+        # square that keeps the blocs sends move, identity first
+        n = self.n
+        m = n - 1
+        transforms = (
+            lambda x, y: (x, y),
+            lambda x, y: (y, m - x),
+            lambda x, y: (m - x, m - y),
+            lambda x, y: (m - y, x),
+            lambda x, y: (m - x, y),
+            lambda x, y: (x, m - y),
+            lambda x, y: (y, x),
+            lambda x, y: (m - y, m - x),
+        )
+        perms = []
+        for t in transforms:
+            if {t(x, y) for (x, y) in self.blocks} != self.blocks:
+                continue
+            perms.append({self.move(x, y): self.move(*t(x, y)) for (x, y) in self.cells})
+        inverse = [{v: k for (k, v) in perm.items()} for perm in perms]
+        return (perms, inverse)
+
+    @functools.cached_property
+    def flat(self):
+        # (windows, last, diagonals) on flat indices x * n + y: the windows
+        # as a (windows, s) array and the heuristic_v1/v2 weight of every
+        # cell as (n * n,) arrays
+        n = self.n
+
+        def flat(bit):
+            (x, y) = divmod(bit, self.stride)
+            return x * n + y
+
+        windows = np.array([[flat(bit) for bit in window] for window in self.windows], dtype=np.intp).reshape(-1, self.s)
+        last = np.array([1 if self.last & move else 0 for move in self.moves], dtype=np.int64)
+        diagonals = np.array([self.terms[move][2] for move in self.moves], dtype=np.int64)
+        return (windows, last, diagonals)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _geometry(n, s, blocks):
+    return Geometry(n, s, blocks)
+
+
+def geometry(n, s, blocks=()):
+    # the shared Geometry for (n, s, blocks), blocks as (x, y) pairs
+    return _geometry(n, s, frozenset(tuple(cell) for cell in blocks))
@@ -0,0 +1,93 @@
+# Bitboard versions of Game.heuristic_v1 and Game.heuristic_v2, plus a
+# window heuristic evaluated with NumPy.
+#
+# heuristic_v1/v2 are cubes of weighted piece-count differences, so they
+# reduce to popcounts over a handful of masks, which come with the board's
+# geometry.Geometry.
+
+import numpy as np
+
+from .board import WHITE, BLACK
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(x):
+        return bin(x).count('1')
+
+
+def heuristic_v1(board):
+    white = board.pieces[WHITE]
+    black = board.pieces[BLACK]
+    last = board.geometry.last
+
+    h1 = popcount(white) - popcount(black)
+    h2 = board.n * (popcount(white & last) - popcount(black & last))
+    return h1 * h1 * h1 + h2 * h2 * h2
+
+
+def heuristic_v2(board):
+    white = board.pieces[WHITE]
+    black = board.pieces[BLACK]
+    last = board.geometry.last
+    diagonals = board.geometry.diagonals
+
+    h1 = popcount(white) - popcount(black)
+    h2 = board.n * (popcount(white & last) - popcount(black & last))
+    h3 = 0
+    for d in diagonals:
+        h3 += popcount(white & d) - popcount(black & d)
+    return h1 * h1 * h1 + h2 * h2 * h2 + h3 * h3 * h3
+
+
+# Window heuristic: every run of s cells on a row, column or diagonal with
+# no bloc in it is a way to win. A window holding only one player's pieces
+# is still open for that player and scores 10^(pieces - 1) for them, windows
+# holding both colours are dead. • counts positive and ◦ negative, like the
+# search values. The windows are Geometry.windows.
+
+_scores = {}
+
+
+def window_scores(s):
+    # A window's cells are summed with ◦ = 1 and • = s + 1, so the sum t has
+    # t % (s + 1) white and t // (s + 1) black pieces. This maps t to the
+    # window's score.
+    if s not in _scores:
+        scores = np.zeros((s + 1) * (s + 1), dtype=np.int64)
+        for white in range(s + 1):
+            for black in range(s + 1 - white):
+                t = white + (s + 1) * black
+                if black and not white:
+                    scores[t] = 10 ** (black - 1)
+                elif white and not black:
+                    scores[t] = -10 ** (white - 1)
+        _scores[s] = scores
+    return _scores[s]
+
+
+def mask_to_array(mask, size):
+    # one uint8 per bit of the mask, in bit index order
+    data = np.frombuffer(mask.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(data, bitorder='little')[:size]
+
+
+def heuristic_windows(board):
+    windows = board.geometry.window_array
+    if not len(windows):
+        return 0
+
+    size = board.n * board.stride
+    cells = mask_to_array(board.pieces[WHITE], size) + mask_to_array(board.pieces[BLACK], size) * np.uint8(board.s + 1)
+    return int(window_scores(board.s)[cells[windows].sum(axis=1)].sum())
+
+
+HEURISTICS = {
+    'v1': heuristic_v1,
+    'v2': heuristic_v2,
+    'windows': heuristic_windows,
+}
+
+# heuristics that give a rotated or reflected position the same value, the
+# only ones Symmetry can be used with (v1/v2 weigh the x = n - 1 line)
+SYMMETRIC = ('windows',)
@@ -0,0 +1,354 @@
+# Monte Carlo tree search.
+#
+# UCT: every iteration walks down the tree picking the child with the best
+# upper confidence bound, adds one new node, plays the rest of the game out
+# with uniformly random moves and backs the result up the path. Nodes keep
+# the score of the player who made their move (1 a win, 0.5 a tie).
+#
+# The tree works on plain white/black masks, not on a Board with watchers,
+# so a playout is just or-ing bits into two ints and checking the four lines
+# through each new piece. The tree is kept between searches: if the new
+# position follows from the old root by moves in the tree, that subtree
+# becomes the root. Root parallel search runs independent trees in worker
+# processes and adds up their root statistics.
+#
+# With batch > 1 every new leaf gets batch playouts at once from
+# batch.playouts, which plays them all in a few NumPy calls, and backs up
+# batch visits.
+
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import batch as kernels
+from .board import Board, WHITE, BLACK, BLOC
+from .heuristics import mask_to_array
+from .stats import SearchStats
+
+TIE = -1
+
+
+class WallClock:
+    """
+    Deadline at an absolute time.time(), which means the same in every process.
+    """
+
+    def __init__(self, end):
+        self.end = end
+
+    def expired(self):
+        return time.time() >= self.end
+
+
+def completes(mask, move, s, directions):
+    # Board.wins_at() for a mask that already has move in it
+    for d in directions:
+        count = 1
+        m = move << d
+        while count < s and mask & m:
+            count += 1
+            m <<= d
+        m = move >> d
+        while count < s and mask & m:
+            count += 1
+            m >>= d
+        if count >= s:
+            return True
+    return False
+
+
+class Node:
+    """
+    One position in the tree, reached by piece playing move.
+    """
+
+    __slots__ = ('move', 'piece', 'parent', 'children', 'untried', 'visits', 'score', 'winner')
+
+    def __init__(self, move, piece, parent=None, winner=None):
+        self.move = move
+        self.piece = piece
+        self.parent = parent
+        self.children = []
+        # moves not expanded yet, filled in on the first expansion
+        self.untried = None
+        self.visits = 0
+        self.score = 0.0
+        self.winner = winner
+
+
+class MCTS:
+    """
+    UCT search over an n x n board with blocs, c is the exploration constant.
+    batch is the number of playouts per new leaf.
+    """
+
+    def __init__(self, n, s, blocks=(), c=1.4, seed=None, batch=1):
+        self.board = Board(n, s, blocks)
+        self.s = s
+        self.directions = self.board.directions
+        self.blocs = self.board.pieces[BLOC]
+        self.full = self.board.full
+        self.c = c
+        self.rng = random.Random(seed)
+        self.batch = batch
+        if batch > 1:
+            self.np_rng = np.random.default_rng(self.rng.getrandbits(64))
+            size = n * self.board.stride
+            # bit index of every cell in x * n + y order, for batch.playouts
+            self.cells = np.array([self.board.stride * x + y for x in range(n) for y in range(n)], dtype=np.intp)
+            self.size = size
+            self.grid = mask_to_array(self.blocs, size) * np.uint8(BLOC)
+        self.root = None
+        self.white = 0
+        self.black = 0
+        self.piece = WHITE
+        self.stats = SearchStats()
+        self.eval_by_depth = {}
+
+    def set_position(self, white, black, piece):
+        # piece is the side to move. Keeps the subtree for this position if
+        # the tree has it, returns whether it did
+        reused = self.advance(white, black, piece)
+        if not reused:
+            self.root = Node(None, BLACK if piece == WHITE else WHITE)
+        self.white = white
+        self.black = black
+        self.piece = piece
+        return reused
+
+    def advance(self, white, black, piece):
+        node = self.root
+        if node is None or self.white & ~white or self.black & ~black:
+            return False
+        new = {WHITE: white & ~self.white, BLACK: black & ~self.black}
+        side = self.piece
+        while new[WHITE] or new[BLACK]:
+            child = None
+            for c in node.children:
+                if c.move & new[side]:
+                    child = c
+                    break
+            if child is None:
+                return False
+            new[side] ^= child.move
+            node = child
+            side = BLACK if side == WHITE else WHITE
+        if side != piece:
+            return False
+        node.parent = None
+        self.root = node
+        return True
+
+    def empty(self, white, black):
+        return self.full & ~(white | black | self.blocs)
+
+    def moves(self, mask):
+        moves = []
+        while mask:
+            move = mask & -mask
+            mask ^= move
+            moves.append(move)
+        return moves
+
+    def select(self, node):
+        # the child with the best upper confidence bound
+        log = math.log(node.visits)
+        c = self.c
+        best = None
+        best_value = -1
+        for child in node.children:
+            value = child.score / child.visits + c * math.sqrt(log / child.visits)
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+    def playout(self, white, black, piece):
+        moves = self.moves(self.empty(white, black))
+        self.rng.shuffle(moves)
+        s = self.s
+        directions = self.directions
+        for move in moves:
+            if piece == WHITE:
+                white |= move
+                if completes(white, move, s, directions):
+                    return WHITE
+                piece = BLACK
+            else:
+                black |= move
+                if completes(black, move, s, directions):
+                    return BLACK
+                piece = WHITE
+        return TIE
+
+    def playouts(self, white, black, piece):
+        # (wins for white, wins for black, ties) of self.batch playouts
+        size = self.size
+        state = self.grid + mask_to_array(white, size) * np.uint8(WHITE) + mask_to_array(black, size) * np.uint8(BLACK)
+        states = np.broadcast_to(state[self.cells].astype(np.int8).reshape(self.board.n, self.board.n),
+                                 (self.batch, self.board.n, self.board.n))
+        winners = kernels.playouts(states, self.s, piece, self.np_rng)
+        return (int((winners == WHITE).sum()), int((winners == BLACK).sum()), int((winners == TIE).sum()))
+
+    def iterate(self):
+        stats = self.stats
+        node = self.root
+        (white, black, piece) = (self.white, self.black, self.piece)
+        ply = 0
+        stats.nodes[0] += 1
+
+        # selection
+        while node.winner is None and not node.untried and node.children:
+            node = self.select(node)
+            if piece == WHITE:
+                white |= node.move
+            else:
+                black |= node.move
+            piece = BLACK if piece == WHITE else WHITE
+            ply += 1
+            stats.grow(ply + 1)
+            stats.nodes[ply] += 1
+
+        # expansion
+        if node.winner is None:
+            if node.untried is None:
+                node.untried = self.moves(self.empty(white, black))
+                self.rng.shuffle(node.untried)
+            if node.untried:
+                move = node.untried.pop()
+                if piece == WHITE:
+                    white |= move
+                    mask = white
+                else:
+                    black |= move
+                    mask = black
+                winner = None
+                if completes(mask, move, self.s, self.directions):
+                    winner = piece
+                elif not self.empty(white, black):
+                    winner = TIE
+                child = Node(move, piece, node, winner)
+                node.children.append(child)
+                node = child
+                piece = BLACK if piece == WHITE else WHITE
+                ply += 1
+                stats.grow(ply + 1)
+                stats.nodes[ply] += 1
+            else:
+                node.winner = TIE
+
+        # simulation, as (visits, white wins, black wins, ties)
+        count = self.batch
+        if node.winner is not None:
+            stats.terminals += 1
+            winner = node.winner
+            results = (count, count if winner == WHITE else 0, count if winner == BLACK else 0, count if winner == TIE else 0)
+        elif count > 1:
+            stats.leaves += 1
+            self.eval_by_depth[ply] = self.eval_by_depth.get(ply, 0) + count
+            results = (count, *self.playouts(white, black, piece))
+        else:
+            stats.leaves += 1
+            self.eval_by_depth[ply] = self.eval_by_depth.get(ply, 0) + 1
+            winner = self.playout(white, black, piece)
+            results = (1, winner == WHITE, winner == BLACK, winner == TIE)
+
+        # backpropagation
+        (visits, white_wins, black_wins, ties) = results
+        while node is not None:
+            node.visits += visits
+            node.score += (white_wins if node.piece == WHITE else black_wins) + 0.5 * ties
+            node = node.parent
+
+    def search(self, deadline=None, iterations=None):
+        # runs until the deadline expires or after iterations playouts
+        self.stats.reset()
+        self.stats.grow(1)
+        self.eval_by_depth = {}
+        count = 0
+        while True:
+            if iterations is not None and count >= iterations:
+                break
+            if deadline is not None and deadline.expired():
+                break
+            self.iterate()
+            count += self.batch
+        self.stats.depth = len(self.stats.nodes) - 1
+        self.stats.stop()
+        return self.root_stats()
+
+    def root_stats(self):
+        # {move: (visits, score)} for the root's children
+        return {child.move: (child.visits, child.score) for child in self.root.children}
+
+    def principal_variation(self):
+        pv = []
+        node = self.root
+        while node.children:
+            node = max(node.children, key=lambda child: child.visits)
+            pv.append(node.move)
+        return pv
+
+
+def best(root_stats, piece):
+    # (value, move) for the most visited move, value on the search scale:
+    # -1 a sure ◦ win, 1 a sure • win
+    if not root_stats:
+        return (None, None)
+    (move, (visits, score)) = max(root_stats.items(), key=lambda item: (item[1][0], -item[0]))
+    rate = score / visits
+    value = 2 * rate - 1
+    return (value if piece == BLACK else -value, move)
+
+
+def search_worker(job):
+    # one root parallel tree, returns (root stats, stats dict, eval_by_depth)
+    (n, s, blocks, white, black, piece, end, iterations, c, seed, batch) = job
+    mcts = MCTS(n, s, blocks, c, seed, batch)
+    mcts.set_position(white, black, piece)
+    root_stats = mcts.search(WallClock(end), iterations)
+    return (root_stats, mcts.stats.to_dict(), mcts.eval_by_depth)
+
+
+class ParallelMCTS:
+    """
+    Root parallel MCTS: each worker grows its own tree from the same position
+    and the root statistics are added up. Trees aren't kept between moves.
+    """
+
+    def __init__(self, workers, c=1.4, seed=None, batch=1):
+        self.workers = workers
+        self.c = c
+        self.batch = batch
+        self.seed = seed
+        self.searches = 0
+        self.pool = ProcessPoolExecutor(workers)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def search(self, n, s, blocks, white, black, piece, seconds=None, iterations=None):
+        # returns (root stats, SearchStats, eval_by_depth)
+        end = time.time() + seconds if seconds is not None else float('inf')
+        per_worker = None if iterations is None else -(-iterations // self.workers)
+        self.searches += 1
+        jobs = []
+        for i in range(self.workers):
+            seed = None if self.seed is None else f'{self.seed}-{self.searches}-{i}'
+            jobs.append((n, s, blocks, white, black, piece, end, per_worker, self.c, seed, self.batch))
+        root_stats = {}
+        stats = SearchStats()
+        eval_by_depth = {}
+        for (worker_stats, worker_search, worker_evals) in self.pool.map(search_worker, jobs):
+            for (move, (visits, score)) in worker_stats.items():
+                (v, sc) = root_stats.get(move, (0, 0.0))
+                root_stats[move] = (v + visits, sc + score)
+            stats.merge(worker_search)
+            stats.depth = max(stats.depth, worker_search['depth'])
+            for (depth, count) in worker_evals.items():
+                eval_by_depth[depth] = eval_by_depth.get(depth, 0) + count
+        stats.stop()
+        return (root_stats, stats, eval_by_depth)
@@ -0,0 +1,250 @@
+# Move ordering for Searcher.alphabeta.
+#
+# An orderer hands the search the empty cells of the current node, best
+# candidates first, and is told which move caused a beta cutoff. The source
+# of a move says which rule put it where it is, so cutoffs can be counted per
+# rule. moves() is the unordered list minimax walks, which only
+# TacticalOrderer makes smaller than every empty cell.
+#
+# Moves and their sources go into one list each per ply, allocated by grow()
+# and refilled at every node of that ply, so a node doesn't build lists or
+# (move, source) tuples. A ply's lists stay as they are while the plies below
+# it are searched.
+
+from .board import WHITE, BLACK
+from .heuristics import popcount
+
+PV = 'pv'
+TT = 'tt'
+KILLER = 'killer'
+HISTORY = 'history'
+PROXIMITY = 'proximity'
+ROW = 'row'
+WIN = 'win'
+BLOCK = 'block'
+
+
+class PlainOrderer:
+    """
+    Row-major order, what alphabeta did before move ordering.
+    """
+
+    sources = (ROW,)
+
+    def __init__(self, board):
+        self.board = board
+        self.pv = []
+        self.follow_pv = False
+        # move_lists[ply] and source_lists[ply], see grow()
+        self.move_lists = []
+        self.source_lists = []
+        self.reset_stats()
+
+    def grow(self, plies):
+        # the search indexes the lists by ply directly
+        while len(self.move_lists) < plies:
+            self.move_lists.append([])
+            self.source_lists.append([])
+
+    def reset_stats(self):
+        self.cutoffs = dict.fromkeys(self.sources, 0)
+        self.first_cutoffs = 0
+
+    def new_search(self):
+        pass
+
+    def start_iteration(self, pv):
+        self.pv = pv
+        self.follow_pv = bool(pv)
+
+    def fill(self, ply, mask, source):
+        # ply's moves are the cells of mask in row-major order, all from
+        # source
+        moves = self.move_lists[ply]
+        sources = self.source_lists[ply]
+        moves.clear()
+        sources.clear()
+        while mask:
+            move = mask & -mask
+            mask ^= move
+            moves.append(move)
+            sources.append(source)
+        return moves
+
+    def moves(self, ply, piece):
+        return self.fill(ply, self.board.empty(), ROW)
+
+    def order(self, ply, piece, tt_move):
+        # ply's moves, their sources are source_lists[ply]
+        return self.fill(ply, self.board.empty(), ROW)
+
+    def cutoff(self, move, source, ply, piece, depth, index):
+        self.cutoffs[source] += 1
+        if index == 0:
+            self.first_cutoffs += 1
+
+    def stats(self):
+        total = sum(self.cutoffs.values())
+        rate = self.first_cutoffs / total if total else 0
+        return f'cutoffs: {self.cutoffs}, first-move cutoffs: {rate:.1%}'
+
+
+class MoveOrderer(PlainOrderer):
+    """
+    Principal variation move first, then the transposition table move, then
+    killer moves for the ply, then the rest by history score and finally by
+    closeness to the center and to pieces already on the board.
+    """
+
+    sources = (PV, TT, KILLER, HISTORY, PROXIMITY)
+
+    def __init__(self, board, killer_slots=2):
+        super().__init__(board)
+        self.killer_slots = killer_slots
+        self.killers = {}
+        self.history = [None, {}, {}]
+
+        # static part of the proximity score: closer to the center is better,
+        # each neighbouring piece counts as much as one step towards it
+        self.center = board.geometry.center
+        self.neighbours = board.geometry.neighbours
+
+    def new_search(self):
+        # killers are per ply of the previous decision, history just fades
+        self.killers = {}
+        for piece in (WHITE, BLACK):
+            history = self.history[piece]
+            for move in history:
+                history[move] //= 2
+
+    def order(self, ply, piece, tt_move, allowed=-1):
+        # allowed limits the moves to a mask of cells
+        board = self.board
+        empty = board.empty() & allowed
+        moves = self.move_lists[ply]
+        sources = self.source_lists[ply]
+        moves.clear()
+        sources.clear()
+        seen = 0
+
+        if self.follow_pv:
+            if ply < len(self.pv) and self.pv[ply] & empty:
+                moves.append(self.pv[ply])
+                sources.append(PV)
+                seen |= self.pv[ply]
+            else:
+                self.follow_pv = False
+
+        if tt_move is not None and tt_move & empty and not tt_move & seen:
+            moves.append(tt_move)
+            sources.append(TT)
+            seen |= tt_move
+
+        for move in self.killers.get(ply, ()):
+            if move & empty and not move & seen:
+                moves.append(move)
+                sources.append(KILLER)
+                seen |= move
+
+        history = self.history[piece]
+        center = self.center
+        neighbours = self.neighbours
+        occupied = board.pieces[WHITE] | board.pieces[BLACK]
+        scored = []
+        rest = empty & ~seen
+        while rest:
+            move = rest & -rest
+            rest ^= move
+            proximity = center[move] + popcount(neighbours[move] & occupied)
+            scored.append((history.get(move, 0), proximity, move))
+        scored.sort(reverse=True)
+
+        for (h, _, move) in scored:
+            moves.append(move)
+            sources.append(HISTORY if h else PROXIMITY)
+        return moves
+
+    def cutoff(self, move, source, ply, piece, depth, index):
+        super().cutoff(move, source, ply, piece, depth, index)
+
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.killer_slots:]
+
+        history = self.history[piece]
+        history[move] = history.get(move, 0) + depth * depth
+
+
+class TacticalOrderer(MoveOrderer):
+    """
+    MoveOrderer that only hands out the moves worth searching: a move that
+    wins at once if there is one, else the cells that block the opponent from
+    winning next move if there are any, else (on boards of at least
+    trim_size) the cells within distance of a piece already played.
+    """
+
+    sources = (WIN, BLOCK) + MoveOrderer.sources
+
+    def __init__(self, board, killer_slots=2, distance=2, trim_size=7):
+        super().__init__(board, killer_slots)
+        self.distance = distance
+        self.trim = board.n >= trim_size
+        # why the last candidates() picked its cells
+        self.source = None
+
+    def near(self, mask):
+        # cells within distance (king moves) of mask, the guard bits keep
+        # shifts from wrapping into the next row
+        board = self.board
+        full = board.full
+        for _ in range(self.distance):
+            grown = mask
+            for d in board.directions:
+                grown |= (mask << d) | (mask >> d)
+            mask = grown & full
+        return mask
+
+    def candidates(self, piece):
+        # mask of the cells to search, self.source says why: WIN, BLOCK or
+        # None when they are ordered the usual way
+        board = self.board
+        wins = board.winning_cells(piece)
+        if wins:
+            self.source = WIN
+            return wins & -wins
+        blocks = board.winning_cells(BLACK if piece == WHITE else WHITE)
+        if blocks:
+            self.source = BLOCK
+            return blocks
+        self.source = None
+        occupied = board.pieces[WHITE] | board.pieces[BLACK]
+        if self.trim and occupied:
+            # blocs can wall the pieces in, then every empty cell is a candidate
+            near = self.near(occupied) & board.empty()
+            if near:
+                return near
+        return -1
+
+    def moves(self, ply, piece):
+        return self.fill(ply, self.board.empty() & self.candidates(piece), ROW)
+
+    def order(self, ply, piece, tt_move, allowed=-1):
+        mask = self.candidates(piece)
+        source = self.source
+        if source == WIN:
+            return self.fill(ply, mask, WIN)
+        moves = super().order(ply, piece, tt_move, allowed & mask)
+        if source == BLOCK:
+            sources = self.source_lists[ply]
+            for i in range(len(sources)):
+                sources[i] = BLOCK
+        return moves
+
+
+def make_orderer(board, ordering=True, tactics=False):
+    # the orderer Engine's ordering and tactics options ask for, ordering
+    # wins over tactics
+    if not ordering:
+        return PlainOrderer(board)
+    return TacticalOrderer(board) if tactics else MoveOrderer(board)
@@ -0,0 +1,262 @@
+# Root-split alpha-beta over a process pool.
+#
+# Every root move is searched by a worker on its own copy of the position.
+# The eldest brother (first move in order) is searched alone first, Young
+# Brothers Wait style, and its value seeds a shared bound that the other
+# workers read before each move to narrow their window. The shared bound is
+# relaxed by one so moves tying the best value still come back exact, which
+# lets the results be combined deterministically: best value, then lowest
+# index in the root order.
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from timeout import Deadline, TimeoutError
+
+from .board import Board, WHITE, BLACK, BLOC
+from .evaluator import IncrementalEvaluator
+from .ordering import make_orderer
+from .scores import INFINITY
+from .search import Searcher
+from .stats import SearchStats
+from .transposition import TranspositionTable, MappedTranspositionTable
+
+_shared = None
+# nodes searched by all workers in this search, see NodeShare
+_nodes = None
+# mapped tables opened by this worker, by path
+_tables = {}
+
+
+def _init_worker(shared, nodes=None):
+    global _shared, _nodes
+    _shared = shared
+    _nodes = nodes
+
+
+class NodeShare:
+    """
+    Deadline that also runs out once all workers together have searched
+    nodes nodes. Each adds its count to the shared total every interval
+    nodes, the total takes a lock.
+    """
+
+    def __init__(self, deadline, stats, total, nodes, interval=128):
+        self.deadline = deadline
+        self.stats = stats
+        self.total = total
+        self.nodes = nodes
+        self.interval = interval
+        self.reported = 0
+
+    def elapsed(self):
+        return self.deadline.elapsed()
+
+    def remaining(self):
+        return self.deadline.remaining()
+
+    def expired(self):
+        return self.deadline.expired() or self.total.value >= self.nodes
+
+    def report(self):
+        # adds what this worker searched since the last report to the total
+        searched = self.stats.total_nodes()
+        with self.total.get_lock():
+            self.total.value += searched - self.reported
+            total = self.total.value
+        self.reported = searched
+        return total
+
+    def check(self):
+        self.deadline.check()
+        if self.stats.total_nodes() - self.reported >= self.interval and self.report() >= self.nodes:
+            raise TimeoutError('Node limit')
+
+
+def position(board):
+    # picklable description of a board, see rebuild()
+    blocks = []
+    m = board.pieces[BLOC]
+    while m:
+        move = m & -m
+        m ^= move
+        blocks.append(board.coords(move))
+    return (board.n, board.s, blocks, board.pieces[WHITE], board.pieces[BLACK])
+
+
+def rebuild(position):
+    (n, s, blocks, white, black) = position
+    board = Board(n, s, blocks)
+    for (piece, m) in ((WHITE, white), (BLACK, black)):
+        while m:
+            move = m & -m
+            m ^= move
+            board.make(move, piece)
+    return board
+
+
+def worker_table(tt_size, tt_path, tt_config):
+    # a fresh table per job, or the worker's handle on the shared file
+    if tt_path is not None:
+        if tt_path not in _tables:
+            _tables[tt_path] = MappedTranspositionTable(tt_path, tt_size, config=tt_config)
+        return _tables[tt_path]
+    return TranspositionTable(tt_size) if tt_size else None
+
+
+def search_root_move(job):
+    # searches one root move, returns (index, value, exact, eval_by_depth,
+    # stats) with value None if the deadline passed first
+    (index, position, move, depth, max, alpha, beta, heuristic, end, nodes, tt_size, tt_path, tt_config, ordering, tactics) = job
+    board = rebuild(position)
+    evaluator = IncrementalEvaluator(board, (heuristic,))
+    tt = worker_table(tt_size, tt_path, tt_config)
+    searcher = Searcher(board, tt=tt, orderer=make_orderer(board, ordering, tactics))
+    # keyed like the parent's Searcher, the table can be a shared file
+    searcher.set_heuristic(evaluator.heuristics[heuristic], heuristic)
+    searcher.root_depth = depth
+    searcher.grow(depth + 1)
+    # end is wall clock time, jobs can sit in the queue for a while
+    searcher.deadline = Deadline(end - time.time())
+    share = None
+    if nodes is not None and _nodes is not None:
+        share = searcher.deadline = NodeShare(searcher.deadline, searcher.stats, _nodes, nodes)
+
+    # the shared value is the best root value found so far
+    if _shared is not None:
+        best = _shared.value
+        if max and best - 1 > alpha:
+            alpha = best - 1
+        elif not max and best + 1 < beta:
+            beta = best + 1
+
+    piece = BLACK if max else WHITE
+    board.make(move, piece)
+    if share is not None and share.expired():
+        return (index, None, False, searcher.eval_by_depth, searcher.stats.to_dict())
+    try:
+        value = searcher._alphabeta(depth - 1, alpha, beta, not max, move)
+    except TimeoutError:
+        return (index, None, False, searcher.eval_by_depth, searcher.stats.to_dict())
+    finally:
+        if share is not None:
+            share.report()
+
+    exact = alpha < value < beta
+    if exact and _shared is not None:
+        with _shared.get_lock():
+            if (max and value > _shared.value) or (not max and value < _shared.value):
+                _shared.value = value
+    return (index, value, exact, searcher.eval_by_depth, searcher.stats.to_dict())
+
+
+class ParallelSearcher:
+    """
+    Iterative deepening where every iteration is a root split over workers.
+    Same results interface as Searcher.iterative().
+    """
+
+    def __init__(self, workers, tt_size=1 << 14, tt_path=None, tt_config='', ordering=True, tactics=False):
+        self.workers = workers
+        self.tt_size = tt_size
+        # with a path the workers share a MappedTranspositionTable made for
+        # tt_config
+        self.tt_path = tt_path
+        self.tt_config = tt_config
+        # orderers of the parent and the workers, see ordering.make_orderer()
+        self.ordering = ordering
+        self.tactics = tactics
+        self.shared = multiprocessing.Value('d', 0.0)
+        # nodes searched by the workers since iterative() started
+        self.nodes = multiprocessing.Value('q', 0)
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self.shared, self.nodes))
+        self.board = None
+        self.orderer = None
+        self.pv = []
+        self.completed_depth = 0
+        self.timed_out = False
+        self.eval_by_depth = {}
+        self.stats = SearchStats()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def root_moves(self, max):
+        self.orderer.grow(1)
+        self.orderer.start_iteration(self.pv)
+        # the orderer refills the list, keep a copy
+        return list(self.orderer.order(0, BLACK if max else WHITE, None))
+
+    def split(self, depth, max, heuristic, deadline, alpha=-INFINITY, beta=INFINITY, nodes=None):
+        # one iteration, returns (value, move) or None if it ran out of time
+        # or nodes
+        moves = self.root_moves(max)
+        if not moves:
+            return None
+        self.shared.value = alpha if max else beta
+        self.eval_by_depth[depth] = self.eval_by_depth.get(depth, 0) + 1
+        self.stats.grow(1)
+        self.stats.nodes[0] += 1
+        pos = position(self.board)
+        end = time.time() + deadline.remaining()
+
+        def job(index):
+            return (index, pos, moves[index], depth, max, alpha, beta, heuristic, end, nodes, self.tt_size, self.tt_path, self.tt_config, self.ordering, self.tactics)
+
+        # eldest brother first, the rest once it has set the shared bound
+        results = [self.pool.submit(search_root_move, job(0)).result()]
+        pending = set()
+        # the brothers would run out of time too
+        if results[0][1] is not None:
+            pending = {self.pool.submit(search_root_move, job(i)) for i in range(1, len(moves))}
+        while pending:
+            (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if any(r[1] is None for r in results):
+                for future in pending:
+                    future.cancel()
+                break
+
+        for (_, _, _, counts, stats) in results:
+            for (d, count) in counts.items():
+                self.eval_by_depth[d] = self.eval_by_depth.get(d, 0) + count
+            self.stats.merge(stats)
+        if any(r[1] is None for r in results):
+            return None
+
+        # exact results beat bounds with the same value, then root order decides
+        def rank(result):
+            (index, value, exact, _, _) = result
+            return (value if max else -value, exact, -index)
+        (index, value, _, _, _) = sorted(results, key=rank)[-1]
+        return (value, moves[index])
+
+    def iterative(self, board, depth, max=False, deadline=None, heuristic='v1', nodes=None):
+        # nodes limits the nodes of all workers together
+        self.board = board
+        self.orderer = make_orderer(board, self.ordering, self.tactics)
+        if deadline is None:
+            deadline = Deadline(float('inf'))
+        self.completed_depth = 0
+        self.timed_out = False
+        self.pv = []
+        self.stats.reset()
+        self.nodes.value = 0
+        best = (None, None, None)
+        for d in range(1, depth + 1):
+            if deadline.expired():
+                self.timed_out = True
+                break
+            result = self.split(d, max, heuristic, deadline, nodes=nodes)
+            if result is None:
+                self.timed_out = deadline.expired()
+                break
+            (value, move) = result
+            self.completed_depth = d
+            self.stats.depth_done()
+            self.pv = [move]
+            best = (value, *self.board.coords(move))
+        self.stats.depth = self.completed_depth
+        self.stats.stop()
+        return best
@@ -0,0 +1,118 @@
+# Pondering.
+#
+# Searching on the opponent's time: after our move the reply our search
+# expects (the second move of its PV) is played on a copy of the position
+# and a worker process searches the result for us while the opponent thinks.
+# When the opponent does play that reply the result is ready, or a little
+# away, when our turn comes (a hit). Otherwise the search is stopped through
+# Limits.stop and thrown away (a miss), and with a MappedTranspositionTable
+# shared between the worker and our own Engine what it stored still warms up
+# the search we then do.
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+from .api import Engine, Position, Limits
+
+# the Engine of the worker process and the event that stops its search, see
+# _init_worker()
+_engine = None
+_stop = None
+
+
+def _init_worker(options, stop):
+    global _engine, _stop
+    _engine = Engine(**options)
+    _stop = stop
+
+
+def ponder_job(position, depth, seconds, algo, heuristic):
+    # runs in the worker, the Engine and its table outlive the job
+    return _engine.search(Position.from_dict(position), Limits(depth, seconds, stop=_stop), algo, heuristic)
+
+
+def key(position):
+    # positions are the same whatever order the pieces were listed in
+    return (position.layout(), tuple(sorted(position.white)), tuple(sorted(position.black)), position.max)
+
+
+def reply(position, move):
+    # position after the side to move plays move
+    after = Position(position.n, position.s, position.blocks, position.white, position.black, not position.max)
+    (after.black if position.max else after.white).append(tuple(move))
+    return after
+
+
+class Ponderer:
+    """
+    One background search at a time, on one worker process whose Engine gets
+    engine_options. Give both Engines the same tt_path for misses to help.
+    """
+
+    def __init__(self, engine_options):
+        options = dict(engine_options)
+        # the worker is one process already, and the Game keeps its own counts
+        options['workers'] = 1
+        options['eval_by_depth_agregate'] = None
+        self.stop = multiprocessing.Event()
+        self.pool = ProcessPoolExecutor(1, initializer=_init_worker, initargs=(options, self.stop))
+        self.future = None
+        self.key = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, position, pv, limits, algo, heuristic):
+        # ponders the position after position's side to move plays pv[0]
+        # and the opponent pv[1], returns False when there is nothing to
+        # ponder (a short PV or a game over by then)
+        self.cancel()
+        if len(pv) < 2:
+            return False
+        taken = set(position.blocks) | set(position.white) | set(position.black)
+        (move, answer) = (tuple(pv[0]), tuple(pv[1]))
+        if move in taken or answer in taken or move == answer:
+            return False
+        target = reply(reply(position, move), answer)
+        # nothing to search if one of the two moves ends the game
+        if target.to_board().winner() is not None:
+            return False
+        self.key = key(target)
+        self.future = self.pool.submit(ponder_job, target.to_dict(), limits.depth, limits.time, algo, heuristic)
+        return True
+
+    def take(self, position):
+        # the pondered SearchResult if position is the one pondered, else
+        # None, and the ponder search is stopped
+        if self.future is None:
+            return None
+        if key(position) != self.key:
+            self.misses += 1
+            self.cancel()
+            return None
+        future = self.future
+        self.future = None
+        self.key = None
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            return None
+        self.hits += 1
+        return result
+
+    def cancel(self):
+        if self.future is None:
+            return
+        if not self.future.cancel():
+            self.stop.set()
+            try:
+                self.future.result()
+            except (CancelledError, BrokenProcessPool):
+                pass
+            self.stop.clear()
+        self.future = None
+        self.key = None
+
+    def close(self):
+        self.cancel()
+        self.pool.shutdown()
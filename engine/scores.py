@@ -0,0 +1,23 @@
+# Search values.
+#
+# ◦ minimizes and • maximizes. Heuristic values are plain ints that grow with
+# the board (cubed piece counts, powers of ten per window), so a finished
+# game is scored WIN, above any of them, and windows start at +-INFINITY,
+# past any score at all. WIN still fits the int64 of a mapped table record.
+
+from .board import WHITE, BLACK
+
+WIN = 1 << 60
+INFINITY = float('inf')
+
+# Board.winner() -> value
+RESULTS = {WHITE: -WIN, BLACK: WIN, -1: 0}
+
+
+def outcome(value):
+    # -1 a proven ◦ win, 1 a proven • win, 0 anything else
+    if value >= WIN:
+        return 1
+    if value <= -WIN:
+        return -1
+    return 0
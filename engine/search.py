@@ -0,0 +1,470 @@
+from timeout import TimeoutError
+
+from .board import WHITE, BLACK
+from .heuristics import heuristic_v1, SYMMETRIC
+from .ordering import PlainOrderer
+from .scores import WIN, INFINITY, RESULTS
+from .stats import SearchStats
+from .transposition import EXACT, LOWER, UPPER
+from .zobrist import SIDE, salt
+
+
+class Searcher:
+    """
+    Minimax, alpha-beta and PVS over a Board.
+    Returns (value, x, y) like the original Game methods.
+    """
+
+    # smallest half width of an aspiration window
+    ASPIRATION = 16
+
+    def __init__(self, board, heuristic=heuristic_v1, eval_by_depth_agregate=None, tt=None, orderer=None, symmetry=None, symmetry_plies=2):
+        self.board = board
+        self.heuristic = heuristic
+        self.tt = tt
+        # xor-ed into table keys so one table can hold searches with several
+        # heuristics and values of s, set_heuristic() sets it by name
+        self.salt = salt(board.s)
+        # with a Symmetry the table is keyed by canonical position and moves
+        # that lead to the same canonical position are searched once in the
+        # first symmetry_plies plies. It is only used while the heuristic is
+        # symmetric, see set_heuristic()
+        if symmetry is not None and len(symmetry) == 1:
+            symmetry = None
+        self.symmetries = symmetry
+        self.symmetry = None
+        self.symmetry_plies = symmetry_plies
+        # frame of the last tt_key()
+        self.frame = None
+        if orderer is None:
+            orderer = PlainOrderer(board)
+        self.orderer = orderer
+        self.root_depth = 0
+        # best move of the last search, the nodes below the root only return
+        # their value
+        self.root_move = None
+        self.pv = []
+        self.stats = SearchStats()
+        self.deadline = None
+        self.completed_depth = 0
+        self.timed_out = False
+        self.eval_by_depth = {}
+        if eval_by_depth_agregate is None:
+            eval_by_depth_agregate = {}
+        self.eval_by_depth_agregate = eval_by_depth_agregate
+
+    def coords(self, move):
+        if move is None:
+            return (None, None)
+        return self.board.coords(move)
+
+    def grow(self, plies):
+        # per ply counters and move lists for a search plies deep
+        self.stats.grow(plies)
+        self.orderer.grow(plies)
+
+    def minimax(self, depth, max=False):
+        self.root_depth = depth
+        self.grow(depth + 1)
+        self.root_move = None
+        value = self._minimax(depth, max)
+        return (value, *self.coords(self.root_move))
+
+    def alphabeta(self, depth, alpha=-INFINITY, beta=INFINITY, max=False):
+        self.root_depth = depth
+        self.grow(depth + 1)
+        self.orderer.start_iteration(self.pv)
+        self.root_move = None
+        value = self._alphabeta(depth, alpha, beta, max)
+        return (value, *self.coords(self.root_move))
+
+    def pvs(self, depth, alpha=-INFINITY, beta=INFINITY, max=False):
+        # same window and value as alphabeta(), negamax flips them for ◦
+        self.root_depth = depth
+        self.grow(depth + 1)
+        self.orderer.start_iteration(self.pv)
+        self.root_move = None
+        if max:
+            value = self._pvs(depth, alpha, beta, max)
+        else:
+            value = -self._pvs(depth, -beta, -alpha, max)
+        return (value, *self.coords(self.root_move))
+
+    def aspiration(self, depth, max, guess):
+        # pvs() in a window around the last iteration's value, widened on
+        # the side it fails until the value lands inside. Heuristic values
+        # change by large factors between depths, so the window scales with
+        # the value
+        delta = abs(guess)
+        if delta < self.ASPIRATION:
+            delta = self.ASPIRATION
+        (alpha, beta) = (guess - delta, guess + delta)
+        while True:
+            result = self.pvs(depth, alpha, beta, max=max)
+            value = result[0]
+            if alpha < value < beta:
+                return result
+            self.stats.aspiration_researches += 1
+            delta *= 8
+            if value <= alpha:
+                alpha = value - delta if delta < WIN else -INFINITY
+            else:
+                beta = value + delta if delta < WIN else INFINITY
+
+    def principal_variation(self, depth, max):
+        # follows best moves stored in the transposition table from the root
+        pv = []
+        if self.tt is None:
+            return pv
+        board = self.board
+        while len(pv) < depth:
+            key = self.tt_key(max)
+            frame = self.frame
+            entry = self.tt.peek(key)
+            if entry is None or entry[4] is None:
+                break
+            move = self.from_table(entry[4], frame)
+            if not move & board.empty():
+                break
+            board.make(move, BLACK if max else WHITE)
+            pv.append(move)
+            max = not max
+        for move in reversed(pv):
+            max = not max
+            board.unmake(move, BLACK if max else WHITE)
+        return pv
+
+    def iterative(self, depth, max=False, deadline=None, algo='alphabeta'):
+        # Deepens 1, 2, 3... up to depth and returns the result of the last
+        # iteration that finished before the deadline, or (None, None, None)
+        # if not even depth 1 did. pvs iterations after the first start from
+        # an aspiration window around the value of the one before.
+        search = {'minimax': self.minimax, 'pvs': self.pvs}.get(algo, self.alphabeta)
+        self.deadline = deadline
+        self.completed_depth = 0
+        self.timed_out = False
+        best = (None, None, None)
+        snapshot = self.board.snapshot()
+        self.pv = []
+        self.orderer.new_search()
+        self.stats.reset()
+        try:
+            for d in range(1, depth + 1):
+                if algo == 'pvs' and best[0] is not None and -WIN < best[0] < WIN:
+                    result = self.aspiration(d, max, best[0])
+                else:
+                    result = search(d, max=max)
+                self.completed_depth = d
+                self.stats.depth_done()
+                self.pv = self.principal_variation(d, max)
+                # keep the last move we had if this iteration found none
+                if result[1] is not None or best[1] is None:
+                    best = result
+        except TimeoutError:
+            # the search was unwound mid-move
+            self.board.restore(snapshot)
+            self.timed_out = True
+        finally:
+            self.deadline = None
+            self.stats.depth = self.completed_depth
+            self.stats.stop()
+        return best
+
+    def result(self, last, max):
+        # the side that played last is the one not moving now
+        if last is None:
+            return self.board.winner()
+        return self.board.winner_at(last, WHITE if max else BLACK)
+
+    def set_heuristic(self, heuristic, name):
+        self.heuristic = heuristic
+        self.salt = salt(self.board.s, name)
+        self.symmetry = self.symmetries if name in SYMMETRIC else None
+
+    def key(self, max):
+        if max:
+            return self.board.key ^ self.salt ^ SIDE
+        return self.board.key ^ self.salt
+
+    def tt_key(self, max):
+        # the table key, and self.frame says how moves are turned for the
+        # table (None when they aren't), read it before the next call
+        if self.symmetry is None:
+            self.frame = None
+            return self.key(max)
+        (key, self.frame) = self.symmetry.canonical()
+        key ^= self.salt
+        if max:
+            key ^= SIDE
+        return key
+
+    def to_table(self, move, frame):
+        if frame is None or move is None:
+            return move
+        return self.symmetry.to_canonical(move, frame)
+
+    def from_table(self, move, frame):
+        if frame is None or move is None:
+            return move
+        return self.symmetry.from_canonical(move, frame)
+
+    def dedupe(self, ply):
+        # set of canonical child keys if symmetric moves should be skipped here
+        symmetry = self.symmetry
+        if symmetry is not None and ply < self.symmetry_plies:
+            return set()
+        return None
+
+    def is_duplicate(self, seen):
+        key = self.symmetry.canonical()[0]
+        if key in seen:
+            return True
+        seen.add(key)
+        return False
+
+    def _minimax(self, depth, max, last=None):
+        # Minimizing for '◦' and maximizing for '•'
+        # Possible values are:
+        # -WIN - win for '◦'
+        # 0    - a tie
+        # WIN  - win for '•'
+        # and heuristic values in between at depth 0.
+        # We're initially setting it to -INFINITY or INFINITY as worse than the worst case:
+        board = self.board
+        stats = self.stats
+        stats.nodes[self.root_depth - depth] += 1
+
+        if depth == 0:
+            stats.leaves += 1
+            return self.heuristic(board)
+
+        self.eval_by_depth[depth] = self.eval_by_depth.get(depth, 0) + 1
+        self.eval_by_depth_agregate[depth] = self.eval_by_depth_agregate.get(depth, 0) + 1
+        if self.deadline is not None:
+            self.deadline.check()
+
+        result = self.result(last, max)
+        if result is not None:
+            stats.terminals += 1
+            return RESULTS[result]
+
+        tt = self.tt
+        if tt is not None:
+            key = self.tt_key(max)
+            frame = self.frame
+            entry = tt.probe(key)
+            stats.tt_probes += 1
+            if entry is not None:
+                stats.tt_hits += 1
+            # never answer the root from the table, it has to return a move
+            if entry is not None and entry[1] >= depth and last is not None:
+                return entry[2]
+
+        ply = self.root_depth - depth
+        value = -INFINITY if max else INFINITY
+        best = None
+        piece = BLACK if max else WHITE
+        seen = self.dedupe(ply)
+        for move in self.orderer.moves(ply, piece):
+            board.make(move, piece)
+            if seen is not None and self.is_duplicate(seen):
+                board.unmake(move, piece)
+                continue
+            v = self._minimax(depth - 1, not max, move)
+            board.unmake(move, piece)
+            if (max and v > value) or (not max and v < value):
+                value = v
+                best = move
+
+        if tt is not None:
+            tt.store(key, depth, value, EXACT, self.to_table(best, frame))
+        if not ply:
+            self.root_move = best
+        return value
+
+    def _alphabeta(self, depth, alpha, beta, max, last=None):
+        board = self.board
+        stats = self.stats
+        stats.nodes[self.root_depth - depth] += 1
+
+        if depth == 0:
+            stats.leaves += 1
+            return self.heuristic(board)
+
+        self.eval_by_depth[depth] = self.eval_by_depth.get(depth, 0) + 1
+        self.eval_by_depth_agregate[depth] = self.eval_by_depth_agregate.get(depth, 0) + 1
+        if self.deadline is not None:
+            self.deadline.check()
+
+        result = self.result(last, max)
+        if result is not None:
+            stats.terminals += 1
+            return RESULTS[result]
+
+        tt = self.tt
+        tt_move = None
+        alpha_orig = alpha
+        beta_orig = beta
+        if tt is not None:
+            key = self.tt_key(max)
+            frame = self.frame
+            entry = tt.probe(key)
+            stats.tt_probes += 1
+            if entry is not None:
+                stats.tt_hits += 1
+            if entry is not None:
+                (_, d, v, flag, tt_move) = entry
+                tt_move = self.from_table(tt_move, frame)
+                if d >= depth and last is not None:
+                    if flag == EXACT:
+                        return v
+                    if flag == LOWER and v >= beta:
+                        return v
+                    if flag == UPPER and v <= alpha:
+                        return v
+
+        orderer = self.orderer
+        ply = self.root_depth - depth
+        value = -INFINITY if max else INFINITY
+        best = None
+        piece = BLACK if max else WHITE
+        seen = self.dedupe(ply)
+        moves = orderer.order(ply, piece, tt_move)
+        sources = orderer.source_lists[ply]
+        for (i, move) in enumerate(moves):
+            board.make(move, piece)
+            if seen is not None and self.is_duplicate(seen):
+                board.unmake(move, piece)
+                continue
+            v = self._alphabeta(depth - 1, alpha, beta, not max, move)
+            board.unmake(move, piece)
+            # only the first child of a PV node is on the PV
+            orderer.follow_pv = False
+            if max:
+                if v > value:
+                    value = v
+                    best = move
+                if value >= beta:
+                    orderer.cutoff(move, sources[i], ply, piece, depth, i)
+                    stats.cutoff(i)
+                    break
+                if value > alpha:
+                    alpha = value
+            else:
+                if v < value:
+                    value = v
+                    best = move
+                if value <= alpha:
+                    orderer.cutoff(move, sources[i], ply, piece, depth, i)
+                    stats.cutoff(i)
+                    break
+                if value < beta:
+                    beta = value
+
+        if tt is not None:
+            if value <= alpha_orig:
+                flag = UPPER
+            elif value >= beta_orig:
+                flag = LOWER
+            else:
+                flag = EXACT
+            tt.store(key, depth, value, flag, self.to_table(best, frame))
+        if not ply:
+            self.root_move = best
+        return value
+
+    def _pvs(self, depth, alpha, beta, max, last=None):
+        # Negamax: values are from the side to move, so • scores as usual and
+        # ◦ negated. The first move gets the full window, the others a null
+        # window that only asks whether they beat alpha, and a move that does
+        # is searched again with the full window. The table keeps values on
+        # the usual scale, shared with _alphabeta().
+        board = self.board
+        stats = self.stats
+        stats.nodes[self.root_depth - depth] += 1
+        sign = 1 if max else -1
+
+        if depth == 0:
+            stats.leaves += 1
+            return sign * self.heuristic(board)
+
+        self.eval_by_depth[depth] = self.eval_by_depth.get(depth, 0) + 1
+        self.eval_by_depth_agregate[depth] = self.eval_by_depth_agregate.get(depth, 0) + 1
+        if self.deadline is not None:
+            self.deadline.check()
+
+        result = self.result(last, max)
+        if result is not None:
+            stats.terminals += 1
+            return sign * RESULTS[result]
+
+        tt = self.tt
+        tt_move = None
+        alpha_orig = alpha
+        beta_orig = beta
+        if tt is not None:
+            key = self.tt_key(max)
+            frame = self.frame
+            entry = tt.probe(key)
+            stats.tt_probes += 1
+            if entry is not None:
+                stats.tt_hits += 1
+                (_, d, v, flag, tt_move) = entry
+                tt_move = self.from_table(tt_move, frame)
+                if d >= depth and last is not None:
+                    v *= sign
+                    # a bound for ◦ is the other bound once negated
+                    if not max and flag != EXACT:
+                        flag = LOWER if flag == UPPER else UPPER
+                    if flag == EXACT:
+                        return v
+                    if flag == LOWER and v >= beta:
+                        return v
+                    if flag == UPPER and v <= alpha:
+                        return v
+
+        orderer = self.orderer
+        ply = self.root_depth - depth
+        value = -INFINITY
+        best = None
+        piece = BLACK if max else WHITE
+        seen = self.dedupe(ply)
+        moves = orderer.order(ply, piece, tt_move)
+        sources = orderer.source_lists[ply]
+        for (i, move) in enumerate(moves):
+            board.make(move, piece)
+            if seen is not None and self.is_duplicate(seen):
+                board.unmake(move, piece)
+                continue
+            if best is None:
+                v = -self._pvs(depth - 1, -beta, -alpha, not max, move)
+            else:
+                # values are ints, so (alpha, alpha + 1) holds none of them
+                v = -self._pvs(depth - 1, -alpha - 1, -alpha, not max, move)
+                if alpha < v < beta:
+                    stats.researches += 1
+                    v = -self._pvs(depth - 1, -beta, -alpha, not max, move)
+            board.unmake(move, piece)
+            # only the first child of a PV node is on the PV
+            orderer.follow_pv = False
+            if v > value or best is None:
+                value = v
+                best = move
+            if value >= beta:
+                orderer.cutoff(move, sources[i], ply, piece, depth, i)
+                stats.cutoff(i)
+                break
+            if value > alpha:
+                alpha = value
+
+        if tt is not None:
+            if value <= alpha_orig:
+                flag = UPPER if max else LOWER
+            elif value >= beta_orig:
+                flag = LOWER if max else UPPER
+            else:
+                flag = EXACT
+            tt.store(key, depth, sign * value, flag, self.to_table(best, frame))
+        if not ply:
+            self.root_move = best
+        return value
@@ -0,0 +1,344 @@
+# Game server.
+#
+# Many games at once over TCP: one JSON object per line in each direction.
+# Sessions live in memory in the event loop, every engine search is sent to
+# a fixed process pool so the loop never blocks on one, and at most
+# max_queue searches wait for a worker before new ones are turned away.
+# Time limits are Limits.time, which the search polls (timeout.Deadline), so
+# nothing depends on SIGALRM and the main thread. Each session has a time
+# budget for its engine moves, charged with the time the searches took.
+#
+#     python -m engine.server --port 8765 --workers 4
+#
+# Requests, each answered with one line, {"error": ...} when it failed:
+#     {"op": "new", "n": 5, "s": 4, "blocks": [[0, 0]], "time": 1, "depth": 6,
+#      "algo": "alphabeta", "heuristic": "v2", "budget": 60}
+#     {"op": "move", "session": "1", "x": 2, "y": 3}    a move by the side to move
+#     {"op": "search", "session": "1", "play": true}    engine move, played if play
+#     {"op": "state", "session": "1"}
+#     {"op": "close", "session": "1"}
+#     {"op": "metrics"}
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .api import Engine, Position, Limits
+from .benchmark import percentile
+from .board import WHITE, BLACK
+from .heuristics import HEURISTICS
+from .trace import render
+
+# the engine of this worker process, see _init_worker()
+_engine = None
+
+
+def _init_worker(options):
+    global _engine
+    _engine = Engine(**options)
+
+
+def search_job(position, depth, seconds, nodes, algo, heuristic):
+    # runs in a worker, the Engine and its table outlive the job
+    result = _engine.search(Position.from_dict(position), Limits(depth, seconds, nodes), algo, heuristic)
+    return result.to_dict()
+
+
+class Session:
+    """
+    One game: the board, whose turn it is and what is left of the budget.
+    """
+
+    def __init__(self, id, n, s, blocks=(), time=1.0, depth=None, nodes=None, algo='alphabeta', heuristic='v2', budget=None):
+        # the same ranges as Game.check_valid_args()
+        if not 3 <= n <= 10:
+            raise ValueError('n should be in the range [3..10]')
+        if not 3 <= s <= n:
+            raise ValueError('s should be in the range [3..n]')
+        if len(blocks) > 2 * n:
+            raise ValueError('there should be at most 2n blocs')
+        for (x, y) in blocks:
+            if not (0 <= x < n and 0 <= y < n):
+                raise ValueError(f'bloc ({x}, {y}) is off the board')
+        if algo not in Engine.ALGOS:
+            raise ValueError(f'unknown search algorithm {algo!r}, expected one of {Engine.ALGOS}')
+        if heuristic not in HEURISTICS:
+            raise ValueError(f'unknown heuristic {heuristic!r}, expected one of {tuple(HEURISTICS)}')
+        self.id = id
+        self.position = Position(n, s, blocks, max=False)
+        self.board = self.position.to_board()
+        self.time = time
+        self.depth = depth
+        self.nodes = nodes
+        self.algo = algo
+        self.heuristic = heuristic
+        # seconds of engine search left, None for no limit
+        self.budget = budget
+        self.winner = None
+        self.searching = False
+        self.touched = time_now()
+
+    def play(self, x, y):
+        if self.winner is not None:
+            raise ValueError('the game is over')
+        board = self.board
+        if not (0 <= x < board.n and 0 <= y < board.n) or not board.move(x, y) & board.empty():
+            raise ValueError(f'({x}, {y}) is not an empty cell')
+        position = self.position
+        piece = BLACK if position.max else WHITE
+        move = board.move(x, y)
+        board.make(move, piece)
+        (position.black if position.max else position.white).append((x, y))
+        position.max = not position.max
+        self.winner = board.winner_at(move, piece)
+
+    def limits(self):
+        # this search's Limits, the time capped by what is left of the budget
+        seconds = self.time
+        if self.budget is not None:
+            if self.budget <= 0:
+                raise ValueError('the time budget is used up')
+            if seconds is None or seconds > self.budget:
+                seconds = self.budget
+        return Limits(self.depth, seconds, self.nodes)
+
+    def state(self):
+        winner = {None: None, WHITE: '◦', BLACK: '•', -1: 'tie'}[self.winner]
+        return {
+            'session': self.id,
+            'position': self.position.to_dict(),
+            'to_move': '•' if self.position.max else '◦',
+            'winner': winner,
+            'budget': self.budget,
+            'board': render(self.board),
+        }
+
+
+def time_now():
+    return time.monotonic()
+
+
+class Metrics:
+    """
+    Request counters, the search queue and latencies of the last window
+    searches.
+    """
+
+    def __init__(self, workers, window=1000):
+        self.workers = workers
+        self.requests = collections.Counter()
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        # (waited for a worker, searched, total) per search, in seconds
+        self.latencies = collections.deque(maxlen=window)
+
+    def queue_depth(self):
+        # searches submitted that no worker has picked up yet
+        return max(0, self.in_flight - self.workers)
+
+    def submitted(self):
+        self.in_flight += 1
+        if self.queue_depth() > self.max_queue_depth:
+            self.max_queue_depth = self.queue_depth()
+
+    def finished(self, wait, search, total):
+        self.in_flight -= 1
+        self.latencies.append((wait, search, total))
+
+    def to_dict(self, sessions):
+        def summary(values):
+            return {'p50': percentile(values, 50), 'p90': percentile(values, 90),
+                    'p99': percentile(values, 99), 'max': max(values, default=0)}
+        return {
+            'sessions': sessions,
+            'workers': self.workers,
+            'requests': dict(self.requests),
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth(),
+            'max_queue_depth': self.max_queue_depth,
+            'searches': len(self.latencies),
+            'latency': summary([t for (_, _, t) in self.latencies]),
+            'queue_wait': summary([w for (w, _, _) in self.latencies]),
+            'search_time': summary([s for (_, s, _) in self.latencies]),
+        }
+
+
+class GameServer:
+    """
+    Sessions and the search pool behind the TCP protocol. engine_options go
+    to the Engine of every worker. Sessions idle for session_timeout seconds
+    are dropped.
+    """
+
+    def __init__(self, workers=2, max_queue=64, max_sessions=1000, session_timeout=3600, engine_options=None):
+        if engine_options is None:
+            engine_options = {'heuristics': ('v1', 'v2', 'windows')}
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_sessions = max_sessions
+        self.session_timeout = session_timeout
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(engine_options,))
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.metrics = Metrics(workers)
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8765):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        # one connection, any number of requests on it
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                reply = await self.dispatch(line)
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request is a JSON object')
+            op = request.get('op')
+            self.metrics.requests[op] += 1
+            handler = getattr(self, f'op_{op}', None)
+            if handler is None:
+                raise ValueError(f'unknown op {op!r}')
+            return await handler(request)
+        except (ValueError, KeyError, TypeError) as e:
+            self.metrics.errors += 1
+            return {'error': str(e) if not isinstance(e, KeyError) else f'missing {e}'}
+        except Exception as e:
+            # a worker that died (BrokenProcessPool) or a bug, the client
+            # still gets its reply line
+            self.metrics.errors += 1
+            return {'error': f'{type(e).__name__}: {e}'}
+
+    def session(self, request):
+        session = self.sessions.get(str(request['session']))
+        if session is None:
+            raise ValueError(f'no session {request["session"]!r}')
+        session.touched = time_now()
+        return session
+
+    def sweep(self):
+        cutoff = time_now() - self.session_timeout
+        for id in [id for (id, session) in self.sessions.items() if session.touched < cutoff and not session.searching]:
+            del self.sessions[id]
+
+    async def op_new(self, request):
+        self.sweep()
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError('too many sessions')
+        options = {key: request[key] for key in ('time', 'depth', 'nodes', 'algo', 'heuristic', 'budget') if key in request}
+        id = str(next(self.ids))
+        session = Session(id, int(request['n']), int(request['s']), [tuple(cell) for cell in request.get('blocks', ())], **options)
+        self.sessions[id] = session
+        return session.state()
+
+    async def op_move(self, request):
+        session = self.session(request)
+        if session.searching:
+            raise ValueError('the engine is searching')
+        session.play(int(request['x']), int(request['y']))
+        return session.state()
+
+    async def op_search(self, request):
+        session = self.session(request)
+        if session.winner is not None:
+            raise ValueError('the game is over')
+        if session.searching:
+            raise ValueError('the engine is already searching')
+        limits = session.limits()
+        if self.metrics.queue_depth() >= self.max_queue:
+            self.metrics.rejected += 1
+            raise ValueError('server busy, try again later')
+
+        session.searching = True
+        self.metrics.submitted()
+        start = time_now()
+        searched = 0.0
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.pool, search_job, session.position.to_dict(), limits.depth,
+                                                limits.time, limits.nodes, session.algo, session.heuristic)
+            searched = result['stats']['elapsed']
+        finally:
+            # a search that failed is out of the queue all the same
+            session.searching = False
+            total = time_now() - start
+            self.metrics.finished(max(0.0, total - searched), searched, total)
+        if session.budget is not None:
+            session.budget -= searched
+        if request.get('play', True) and result['move'] is not None:
+            session.play(*result['move'])
+        return {'result': result, **session.state()}
+
+    async def op_state(self, request):
+        return self.session(request).state()
+
+    async def op_close(self, request):
+        session = self.session(request)
+        del self.sessions[session.id]
+        return {'session': session.id, 'closed': True}
+
+    async def op_metrics(self, request):
+        return self.metrics.to_dict(len(self.sessions))
+
+
+async def serve(host, port, **options):
+    server = GameServer(**options)
+    try:
+        await server.start(host, port)
+        print(f'serving on {host}:{port}')
+        await server.server.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Line em up game server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='search processes')
+    parser.add_argument('--max-queue', type=int, default=64, help='searches waiting for a worker before requests are refused')
+    parser.add_argument('--max-sessions', type=int, default=1000)
+    parser.add_argument('--session-timeout', type=float, default=3600, help='seconds before an idle session is dropped')
+    parser.add_argument('--tt-size', type=int, default=1 << 16)
+    parser.add_argument('--tactics', action='store_true')
+    args = parser.parse_args(argv)
+
+    engine_options = {'heuristics': ('v1', 'v2', 'windows'), 'tt_size': args.tt_size, 'tactics': args.tactics}
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, max_queue=args.max_queue,
+                          max_sessions=args.max_sessions, session_timeout=args.session_timeout,
+                          engine_options=engine_options))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
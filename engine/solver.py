@@ -0,0 +1,161 @@
+# Exact endgame solver.
+#
+# With few empty cells left the rest of the game tree can be searched to the
+# end, so the solver plays for the result (◦ wins -WIN, tie 0, • wins WIN, see scores) instead
+# of a heuristic value. Threats cut the tree down:
+# - if the side to move can complete s in a row it wins, nothing else is searched;
+# - if the opponent could complete a line at one cell, that cell is the only
+#   move worth searching (anything else loses at once), and if it could at
+#   two or more cells the position is lost.
+# Results are cached by Zobrist key and side to move with the same bound flags
+# as the transposition table, and the cache can be kept between solves.
+
+from .board import WHITE, BLACK
+from .scores import WIN, INFINITY, RESULTS
+from .stats import SearchStats
+from .transposition import EXACT, LOWER, UPPER
+from .zobrist import SIDE, salt
+
+class Solver:
+    """
+    Proves the result of a Board position by searching to the end of the
+    game. cache maps key -> (value, flag, move), and is cleared when it gets
+    past max_cache entries.
+    """
+
+    def __init__(self, board, cache=None, max_cache=1 << 20):
+        self.board = board
+        if cache is None:
+            cache = {}
+        self.cache = cache
+        self.max_cache = max_cache
+        # results depend on s too, a cache can outlive a layout
+        self.salt = salt(board.s)
+        self.stats = SearchStats()
+        self.deadline = None
+
+    def solve(self, max=False, deadline=None):
+        # (value, move) with the exact game result, raises TimeoutError if
+        # the deadline passes first (the board is left mid-search then)
+        if len(self.cache) > self.max_cache:
+            self.cache.clear()
+        empties = bin(self.board.empty()).count('1')
+        self.deadline = deadline
+        self.stats.reset()
+        self.stats.grow(empties + 1)
+        try:
+            return self._solve(max, -WIN, WIN, None, 0)
+        finally:
+            self.deadline = None
+            self.stats.depth = empties
+            self.stats.stop()
+
+    def key(self, max):
+        if max:
+            return self.board.key ^ self.salt ^ SIDE
+        return self.board.key ^ self.salt
+
+    def principal_variation(self, max):
+        # follows the cached best moves from the current position
+        board = self.board
+        pv = []
+        while True:
+            entry = self.cache.get(self.key(max))
+            if entry is None or entry[2] is None or not entry[2] & board.empty():
+                break
+            board.make(entry[2], BLACK if max else WHITE)
+            pv.append(entry[2])
+            max = not max
+        for move in reversed(pv):
+            max = not max
+            board.unmake(move, BLACK if max else WHITE)
+        return pv
+
+    def winning_moves(self, piece, empty, first=False):
+        # empty cells where piece completes a line
+        board = self.board
+        moves = []
+        while empty:
+            move = empty & -empty
+            empty ^= move
+            if board.wins_at(move, piece):
+                moves.append(move)
+                if first:
+                    break
+        return moves
+
+    def _solve(self, max, alpha, beta, last, ply):
+        board = self.board
+        stats = self.stats
+        stats.nodes[ply] += 1
+        if self.deadline is not None:
+            self.deadline.check()
+
+        if last is None:
+            result = board.winner()
+        else:
+            result = board.winner_at(last, WHITE if max else BLACK)
+        if result is not None:
+            stats.terminals += 1
+            return (RESULTS[result], None)
+
+        key = self.key(max)
+        entry = self.cache.get(key)
+        tt_move = None
+        if entry is not None:
+            (v, flag, tt_move) = entry
+            # the root has to come back with a move
+            if tt_move is not None or last is not None:
+                if flag == EXACT or (flag == LOWER and v >= beta) or (flag == UPPER and v <= alpha):
+                    return (v, tt_move)
+
+        piece = BLACK if max else WHITE
+        other = WHITE if max else BLACK
+        win = WIN if max else -WIN
+        empty = board.empty()
+
+        wins = self.winning_moves(piece, empty, first=True)
+        if wins:
+            self.cache[key] = (win, EXACT, wins[0])
+            return (win, wins[0])
+
+        threats = self.winning_moves(other, empty)
+        if len(threats) > 1:
+            # can only block one of them
+            self.cache[key] = (-win, EXACT, threats[0])
+            return (-win, threats[0])
+        if threats:
+            moves = threats
+        else:
+            moves = board.empty_moves()
+            if tt_move is not None and tt_move & empty:
+                moves.remove(tt_move)
+                moves.insert(0, tt_move)
+
+        alpha_orig = alpha
+        beta_orig = beta
+        value = -INFINITY if max else INFINITY
+        best = None
+        for (i, move) in enumerate(moves):
+            board.make(move, piece)
+            (v, _) = self._solve(not max, alpha, beta, move, ply + 1)
+            board.unmake(move, piece)
+            if (max and v > value) or (not max and v < value):
+                value = v
+                best = move
+            if max:
+                alpha = alpha if alpha > value else value
+            else:
+                beta = beta if beta < value else value
+            if alpha >= beta:
+                stats.cutoff(i)
+                break
+
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta_orig:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.cache[key] = (value, flag, best)
+        return (value, best)
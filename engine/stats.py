@@ -0,0 +1,125 @@
+# Counters every search routine reports into.
+#
+# One SearchStats covers one move decision. Nodes are counted by ply (distance
+# from the root), not by remaining depth like Game.eval_by_depth, so
+# iterations of different depths add up in the same slots.
+
+import time
+
+
+class SearchStats:
+    """
+    Node, cutoff and table counters for one search.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = []
+        self.leaves = 0
+        self.terminals = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        # PVS moves searched again after beating their null window, and
+        # aspiration windows the value fell outside of
+        self.researches = 0
+        self.aspiration_researches = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.depth = 0
+        # depth_times[d - 1] is when iteration d finished, from the start
+        self.depth_times = []
+        self.start_time = time.perf_counter()
+        self.elapsed = 0
+
+    def grow(self, plies):
+        # the search indexes nodes[ply] directly
+        if len(self.nodes) < plies:
+            self.nodes.extend([0] * (plies - len(self.nodes)))
+
+    def cutoff(self, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_cutoffs += 1
+
+    def start(self):
+        self.start_time = time.perf_counter()
+
+    def depth_done(self):
+        self.depth_times.append(time.perf_counter() - self.start_time)
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.start_time
+
+    def merge(self, other):
+        # adds the counters of another SearchStats, or of its to_dict()
+        if isinstance(other, SearchStats):
+            other = other.to_dict()
+        self.grow(len(other['nodes_by_ply']))
+        for (ply, count) in enumerate(other['nodes_by_ply']):
+            self.nodes[ply] += count
+        self.leaves += other['leaves']
+        self.terminals += other['terminals']
+        self.cutoffs += other['cutoffs']
+        self.first_cutoffs += other['first_move_cutoffs']
+        self.researches += other['researches']
+        self.aspiration_researches += other['aspiration_researches']
+        self.tt_probes += other['tt_probes']
+        self.tt_hits += other['tt_hits']
+
+    def total_nodes(self):
+        return sum(self.nodes)
+
+    def average_ply(self):
+        total = self.total_nodes()
+        if not total:
+            return 0
+        return sum(ply * count for (ply, count) in enumerate(self.nodes)) / total
+
+    def branching_factor(self):
+        # effective branching factor: the b with b^d = nodes for the deepest ply reached
+        total = self.total_nodes()
+        plies = len([count for count in self.nodes if count]) - 1
+        if plies <= 0:
+            return 0
+        return total ** (1 / plies)
+
+    def first_cutoff_rate(self):
+        if not self.cutoffs:
+            return 0
+        return self.first_cutoffs / self.cutoffs
+
+    def nodes_per_second(self):
+        if not self.elapsed:
+            return 0
+        return self.total_nodes() / self.elapsed
+
+    def to_dict(self):
+        return {
+            'nodes': self.total_nodes(),
+            'nodes_by_ply': list(self.nodes),
+            'leaves': self.leaves,
+            'terminals': self.terminals,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_cutoffs,
+            'first_move_cutoff_rate': self.first_cutoff_rate(),
+            'researches': self.researches,
+            'aspiration_researches': self.aspiration_researches,
+            'branching_factor': self.branching_factor(),
+            'average_ply': self.average_ply(),
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'depth': self.depth,
+            'depth_times': list(self.depth_times),
+            'elapsed': self.elapsed,
+            'nodes_per_second': self.nodes_per_second(),
+        }
+
+    def __str__(self):
+        text = (f'nodes: {self.total_nodes()}, leaves: {self.leaves}, terminals: {self.terminals}, '
+                f'cutoffs: {self.cutoffs} ({self.first_cutoff_rate():.1%} first move), '
+                f'branching factor: {self.branching_factor():.2f}, nodes/s: {self.nodes_per_second():.0f}')
+        if self.researches or self.aspiration_researches:
+            text += f', re-searches: {self.researches} null window, {self.aspiration_researches} aspiration'
+        return text
@@ -0,0 +1,69 @@
+# Symmetries of the square that the bloc layout keeps.
+#
+# Rotating or reflecting a position whose blocs map onto themselves gives a
+# position of the same game with the same value, so those positions can
+# share one transposition table entry and symmetric moves only need to be
+# searched once. Symmetry follows a Board like IncrementalEvaluator and
+# keeps the Zobrist key of the position under every kept transform; the
+# smallest one is the canonical key.
+#
+# heuristic_v1/v2 count the x = n - 1 line on its own, so they aren't
+# symmetric: a transformed position can have another value and another best
+# move. Searcher only uses a Symmetry with the heuristics in
+# heuristics.SYMMETRIC.
+
+from .board import WHITE, BLACK, BLOC
+
+
+class Symmetry:
+    """
+    Canonical keys and move mapping for the symmetries a board's blocs keep.
+    """
+
+    def __init__(self, board, follow=True):
+        # follow=False only computes the keys of the board as it is now,
+        # call reset() to redo them after it changed
+        self.board = board
+        # perms[i][move] is where transform i sends move, see Geometry.symmetries
+        (self.perms, self.inverse) = board.geometry.symmetries
+
+        self.reset()
+        # with only the identity there is nothing to follow
+        if follow and len(self.perms) > 1:
+            board.watchers += (self,)
+
+    def __len__(self):
+        return len(self.perms)
+
+    def reset(self):
+        board = self.board
+        zobrist = board.zobrist
+        self.keys = [0] * len(self.perms)
+        for piece in (WHITE, BLACK, BLOC):
+            m = board.pieces[piece]
+            while m:
+                move = m & -m
+                m ^= move
+                for (i, perm) in enumerate(self.perms):
+                    self.keys[i] ^= zobrist[piece][perm[move]]
+
+    def place(self, move, piece):
+        keys = self.keys
+        zobrist = self.board.zobrist[piece]
+        for (i, perm) in enumerate(self.perms):
+            keys[i] ^= zobrist[perm[move]]
+
+    # xor undoes itself
+    remove = place
+
+    def canonical(self):
+        # (key, frame): the smallest key and the transform that gives it
+        keys = self.keys
+        key = min(keys)
+        return (key, keys.index(key))
+
+    def to_canonical(self, move, frame):
+        return self.perms[frame][move]
+
+    def from_canonical(self, move, frame):
+        return self.inverse[frame][move]
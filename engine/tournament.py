@@ -0,0 +1,109 @@
+# Tournament runner for the scoreboard experiments.
+#
+# Every (configuration, game number) pair is one job on a process pool. Each
+# finished game is appended to a JSON lines results file right away, and a
+# rerun skips the games already in it, so a crash only loses the games that
+# were still being played. The scoreboard is written from the results file
+# once every game is done.
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+FIELDS = ('n', 'b', 's', 't', 'd1', 'd2', 'algo', 'blocks')
+
+
+def make_config(config):
+    # accepts (n, b, s, t, d1, d2, algo, blocks) tuples or dicts
+    if not isinstance(config, dict):
+        config = dict(zip(FIELDS, config))
+    config = dict(config)
+    config['blocks'] = [tuple(block) for block in config.get('blocks') or []]
+    return config
+
+
+def config_key(config):
+    return json.dumps(config, sort_keys=True)
+
+
+def load_results(path):
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # half-written last line from a crash
+                continue
+            results[(config_key(make_config(record['config'])), record['game'])] = record
+    return results
+
+
+def run_tournament(configs, play_game, games=10, workers=None, results_path='out/tournament.jsonl'):
+    # play_game(config, game) returns a dict of game stats and has to be a
+    # module level function so it can be sent to the workers
+    configs = [make_config(config) for config in configs]
+    results = load_results(results_path)
+    jobs = [(config, game) for config in configs for game in range(games)
+            if (config_key(config), game) not in results]
+
+    if jobs:
+        with open(results_path, 'a') as f, ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(play_game, config, game): (config, game) for (config, game) in jobs}
+            for future in as_completed(futures):
+                (config, game) = futures[future]
+                record = {'config': config, 'game': game, 'stats': future.result()}
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                results[(config_key(config), game)] = record
+
+    return [[results[(config_key(config), game)]['stats'] for game in range(games)] for config in configs]
+
+
+def merge_stats(stats):
+    # per-game stats of one configuration, summed like Game's scoreboard counters
+    total = {'games': len(stats), 'e1': 0, 'e2': 0, 'i': 0, 'ii': 0, 'iii': {}, 'iv': 0, 'v': 0, 'vi': 0}
+    for game in stats:
+        if game['winner'] == 1:
+            total['e1'] += 1
+        elif game['winner'] == 2:
+            total['e2'] += 1
+        for field in ('i', 'ii', 'iv', 'v', 'vi'):
+            total[field] += game.get(field, 0)
+        for (depth, count) in game['iii'].items():
+            total['iii'][int(depth)] = total['iii'].get(int(depth), 0) + count
+    return total
+
+
+def write_scoreboard(configs, results, path='out/scoreboard.txt'):
+    # same layout as Game.scoreboard() followed by Game.scoreboard_update()
+    configs = [make_config(config) for config in configs]
+    with open(path, 'w') as f:
+        for (index, (config, stats)) in enumerate(zip(configs, results)):
+            total = merge_stats(stats)
+            games = total['games']
+            n, b, s, t = config['n'], config['b'], config['s'], config['t']
+            if index == 0:
+                f.write(f'n={n} b={b} s={s} t={t}\n')
+                f.write(f'\nPlayer 1: d={config["d1"]}\n')
+                f.write(f'Player 2: d={config["d2"]}\n')
+            else:
+                f.write(f'\n{"=" * 100}\n')
+                f.write(f'n={n} b={b} s={s} t={t}\n')
+                f.write(f'\nPlayer 1: {config["d1"]}\n')
+                f.write(f'Player 2: {config["d2"]}\n')
+            f.write(f'number of games {games}\n\n')
+            f.write(f'Total wins for heuristic e1: {total["e1"]/games:.1%}\n')
+            f.write(f'Total wins for heuristic e2: {total["e2"]/games:.1%}\n')
+            f.write(f'\n ')
+            f.write(f'i\tAverage evaluation time: {total["i"]/games:.2f}\n')
+            f.write(f'ii\tTotal heuristic evaluations: {total["ii"]/games:.2f}\n')
+            f.write(f'iii\tEvaluations by depth: {total["iii"]}\n')
+            f.write(f'iv\tTotal evaluation depth: {total["iv"]/games:.2f}\n')
+            f.write(f'v\tTotal recursion depth: {total["v"]/games:.2f}\n')
+            f.write(f'vi\tAverage moves per game: {total["vi"]/games:.2f}\n')
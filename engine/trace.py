@@ -0,0 +1,133 @@
+# Game traces.
+#
+# A GameTrace hands every trace event to its sinks, and the sinks keep what
+# they would write in memory until flush(), which Game calls once the game is
+# over. So a game costs one file open per sink instead of several per move,
+# and the board is only rendered when a text sink wants it.
+#
+# Sinks:
+# - TextTrace: the original gameTrace layout, board and info text per event;
+# - JsonTrace: one JSON object per line (header, AI moves with their search
+#   stats, notes, and an end record with the winner and the move list).
+# Both can write gzip files. Names carry a run id and the game number, so
+# games of one run and separate runs never overwrite each other.
+
+import gzip
+import json
+import os
+import time
+
+from .board import EMPTY, WHITE, BLACK, BLOC
+
+SYMBOLS = {EMPTY: '□', WHITE: '◦', BLACK: '•', BLOC: '⊠'}
+
+
+def render(board):
+    # rows are y, columns are x
+    n = board.n
+    return ''.join(' '.join(SYMBOLS[board.cell(x, y)] for x in range(n)) + ' \n' for y in range(n))
+
+
+def make_run_id():
+    # unique enough for files of one run: start time and process
+    return f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}'
+
+
+class TraceSink:
+    """
+    Buffers text in memory and writes it out on flush().
+    """
+
+    extension = ''
+
+    def __init__(self, path, compress=False):
+        self.path = path + self.extension + ('.gz' if compress else '')
+        self.compress = compress
+        self.buffer = []
+        self.started = False
+
+    def write(self, text):
+        self.buffer.append(text)
+
+    def flush(self):
+        # the first flush creates the file, later ones append (several gzip
+        # members in one file still read back as one stream)
+        if self.started and not self.buffer:
+            return
+        mode = 'at' if self.started else 'wt'
+        opener = gzip.open if self.compress else open
+        with opener(self.path, mode, encoding='utf-8') as f:
+            f.write(''.join(self.buffer))
+        self.buffer = []
+        self.started = True
+
+
+class TextTrace(TraceSink):
+    """
+    The original human readable trace.
+    """
+
+    extension = '.txt'
+
+    def header(self, record):
+        self.write(f'n={record["n"]} b={record["b"]} s={record["s"]} t={record["t"]}\n')
+        self.write(f'\nPlayer 1: {record["player_x"]}\n')
+        self.write(f'Player 2: {record["player_o"]}\n')
+
+    def event(self, board, text, record):
+        # records without text are for the structured traces only
+        if text is None:
+            return
+        self.write(f'\n{render(board)}\n')
+        self.write(f'\n{text}\n')
+
+
+class JsonTrace(TraceSink):
+    """
+    Compact trace, one JSON record per line.
+    """
+
+    extension = '.jsonl'
+
+    def header(self, record):
+        self.write(json.dumps({'type': 'header', **record}) + '\n')
+
+    def event(self, board, text, record):
+        if record is None:
+            record = {'type': 'note', 'text': text}
+        self.write(json.dumps(record) + '\n')
+
+
+SINKS = {
+    'text': TextTrace,
+    'jsonl': JsonTrace,
+}
+
+
+class GameTrace:
+    """
+    Sends trace events to one sink per format in formats (keys of SINKS).
+    path is the file name without extension, {kind} is replaced by
+    'gameTrace' for text and 'gameStats' for the others.
+    """
+
+    def __init__(self, path, formats=('text', 'jsonl'), compress=False):
+        for name in formats:
+            if name not in SINKS:
+                raise ValueError(f'unknown trace format {name!r}, expected one of {list(SINKS)}')
+        self.sinks = [SINKS[name](path.format(kind='gameTrace' if name == 'text' else 'gameStats'), compress)
+                      for name in formats]
+
+    def header(self, record):
+        for sink in self.sinks:
+            sink.header(record)
+
+    def event(self, board, text, record=None):
+        # text goes to the text trace, record (a dict with a 'type') to the
+        # structured ones, which fall back to a note with the text
+        for sink in self.sinks:
+            sink.event(board, text, record)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
@@ -0,0 +1,201 @@
+# Bounded transposition table for Searcher.
+
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# replacement policies when two keys map to the same slot
+ALWAYS = 'always'
+DEPTH = 'depth'
+
+
+class TranspositionTable:
+    """
+    Fixed number of slots indexed by Zobrist key.
+    Entries are (key, depth, value, flag, move) tuples.
+    """
+
+    def __init__(self, size=1 << 16, replace=DEPTH):
+        if replace not in (ALWAYS, DEPTH):
+            raise ValueError(f'Unknown replacement policy: {replace}')
+        self.size = size
+        self.replace = replace
+        self.entries = [None] * size
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.reset_stats()
+
+    # nothing to release, see MappedTranspositionTable
+    def close(self):
+        pass
+
+    def probe(self, key):
+        entry = self.entries[key % self.size]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] != key:
+            # slot is taken by another position
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    # like probe(), without counting
+    def peek(self, key):
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, value, flag, move):
+        i = key % self.size
+        entry = self.entries[i]
+        # depth-preferred: keep the deeper result of two different positions
+        if self.replace == DEPTH and entry is not None and entry[0] != key and entry[1] > depth:
+            return
+        self.entries[i] = (key, depth, value, flag, move)
+
+    def stats(self):
+        return f'hits: {self.hits}, misses: {self.misses}, collisions: {self.collisions}'
+
+
+class MappedTranspositionTable:
+    """
+    TranspositionTable kept in a memory mapped file, so it survives the run
+    and every process that opens the same file shares it. config (see
+    table_config()) is written into a new file, a file made for another one
+    is refused.
+    """
+
+    # File layout, little endian: a header (magic, number of slots, config)
+    # and then one fixed-size record per slot:
+    #     check   key ^ value ^ data, see below
+    #     value   signed 64 bit
+    #     data    depth | flag << 8 | (move bit + 1) << 10 | USED
+    # Nothing is locked. Writes from two processes to one slot can interleave
+    # and leave a record mixed from both, but then check ^ value ^ data is no
+    # longer a key anyone stored and the slot reads as a miss. The worst case
+    # is a lost entry, never a wrong one.
+    MAGIC = b'LEMTT002'
+    HEADER = struct.Struct('<8sQ48s')
+    RECORD = struct.Struct('<QqI')
+    USED = 1 << 31
+    MASK = (1 << 64) - 1
+
+    def __init__(self, path, size=1 << 16, replace=DEPTH, config=''):
+        if replace not in (ALWAYS, DEPTH):
+            raise ValueError(f'Unknown replacement policy: {replace}')
+        self.path = path
+        self.replace = replace
+        self.config = config
+        if not os.path.exists(path):
+            self.create(path, size, config)
+        self.file = open(path, 'r+b')
+        (magic, size, found) = self.HEADER.unpack(self.file.read(self.HEADER.size))
+        if magic != self.MAGIC:
+            self.file.close()
+            raise ValueError(f'{path} is not a transposition table')
+        found = found.rstrip(b'\0').decode()
+        if found != config:
+            self.file.close()
+            raise ValueError(f'{path} is a table for {found!r}, not {config!r}')
+        # an existing file keeps the size it was made with
+        self.size = size
+        self.data = mmap.mmap(self.file.fileno(), self.HEADER.size + size * self.RECORD.size)
+        self.reset_stats()
+
+    @classmethod
+    def create(cls, path, size, config=''):
+        # written to a temporary file and linked into place, so a process
+        # racing us never sees a half-made table
+        directory = os.path.dirname(path) or '.'
+        (fd, tmp) = tempfile.mkstemp(dir=directory)
+        try:
+            os.chmod(tmp, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(cls.HEADER.pack(cls.MAGIC, size, config.encode()))
+                f.truncate(cls.HEADER.size + size * cls.RECORD.size)
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.remove(tmp)
+
+    def close(self):
+        self.data.flush()
+        self.data.close()
+        self.file.close()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def clear(self):
+        self.data[self.HEADER.size:] = bytes(self.size * self.RECORD.size)
+        self.reset_stats()
+
+    def read(self, i):
+        # (key, depth, value, flag, move) in slot i, or None if it's empty or torn
+        (check, value, data) = self.RECORD.unpack_from(self.data, self.HEADER.size + i * self.RECORD.size)
+        if not data & self.USED:
+            return None
+        key = check ^ (value & self.MASK) ^ data
+        index = (data >> 10 & 0x1FFF) - 1
+        return (key, data & 0xFF, value, data >> 8 & 3, None if index < 0 else 1 << index)
+
+    def probe(self, key):
+        entry = self.read(key % self.size)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def peek(self, key):
+        entry = self.read(key % self.size)
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, value, flag, move):
+        i = key % self.size
+        if self.replace == DEPTH:
+            entry = self.read(i)
+            if entry is not None and entry[0] != key and entry[1] > depth:
+                return
+        # +-INFINITY only says nothing was searched, and doesn't fit an int64
+        if math.isinf(value):
+            return
+        value = int(value)
+        index = 0 if move is None else move.bit_length()
+        data = min(depth, 0xFF) | flag << 8 | index << 10 | self.USED
+        check = key ^ (value & self.MASK) ^ data
+        self.RECORD.pack_into(self.data, self.HEADER.size + i * self.RECORD.size, check, value, data)
+
+    def stats(self):
+        return f'hits: {self.hits}, misses: {self.misses}, collisions: {self.collisions}'
+
+
+def table_config(n, s, heuristics):
+    # what a MappedTranspositionTable file was made for: its entries only
+    # mean something to searches of the same n, s and heuristics
+    return f'n={n} s={s} heuristics={",".join(heuristics)}'
@@ -0,0 +1,39 @@
+# Zobrist keys for Board positions.
+#
+# Keys come from a fixed seed so the same position hashes the same way in
+# every process and every run. A key only covers the cells, so values that
+# also depend on s or the heuristic are stored under key ^ salt(s, heuristic).
+
+import random
+
+# xor-ed in when • is the side to move
+SIDE = random.Random(0x51DE).getrandbits(64)
+
+_tables = {}
+_salts = {}
+
+
+def zobrist_keys(n):
+    # keys[piece][move] for every single-bit move on an n x n board
+    if n in _tables:
+        return _tables[n]
+
+    rng = random.Random(0x2083 + n)
+    stride = n + 1
+    # indexed by cell value like Board.pieces: white, black, bloc
+    keys = [None, {}, {}, {}]
+    for piece in (1, 2, 3):
+        for x in range(n):
+            for y in range(n):
+                keys[piece][1 << (x * stride + y)] = rng.getrandbits(64)
+
+    _tables[n] = keys
+    return keys
+
+
+def salt(s, heuristic=None):
+    # 64 bits for lines of s scored with heuristic (None for exact results),
+    # seeded with a string so it is the same in every process
+    if (s, heuristic) not in _salts:
+        _salts[(s, heuristic)] = random.Random(f'salt {s} {heuristic}').getrandbits(64)
+    return _salts[(s, heuristic)]
@@ -1,8 +1,20 @@
 # BASED ON SKELETON CODE IN SAME REPOSITORY
+import contextlib
+import io
+import os
+import shutil
+import tempfile
 import time
 import numpy as np
 import random
 from timeout import *
+from engine import Board, Engine, Position, Limits, EMPTY, WHITE, BLACK, INFINITY
+from engine import heuristics
+from engine.book import OpeningBook
+from engine.ponder import Ponderer
+from engine.scores import outcome
+from engine.trace import GameTrace, render, make_run_id
+from engine.tournament import run_tournament, write_scoreboard
 
 
 class Game:
@@ -10,13 +22,18 @@ class Game:
     ALPHABETA = 1
     HUMAN = 2
     AI = 3
+    MCTS = 4
+    PVS = 5
+
+    # Engine names of the search algorithms
+    ALGOS = {MINIMAX: 'minimax', ALPHABETA: 'alphabeta', MCTS: 'mcts', PVS: 'pvs'}
 
     # □ = 0
     # ◦ = 1
     # • = 2
     # ⊠ = 3
 
-    def __init__(self, recommend = True, n = 3, b = 0, s = 3, d1=6, d2=6, t=8, blocks=[]):
+    def __init__(self, recommend = True, n = 3, b = 0, s = 3, d1=6, d2=6, t=8, blocks=[], tt_size=1 << 16, tt_replace='depth', ordering=True, heuristic_x='v1', heuristic_o='v2', incremental=True, check_eval=False, workers=1, symmetry=False, seed=None, trace_formats=('text', 'jsonl'), trace_gzip=False, run_id=None, book=None, tt_path=None, solve_below=12, tactics=True, ponder=False):
         self.recommend = recommend
         self.game_count = -1
         self.n = n
@@ -25,18 +42,70 @@ class Game:
         self.d1 = d1
         self.d2 = d2
         self.t = t
+        self.ordering = ordering
+        # names from engine.heuristics.HEURISTICS, e1 is ◦'s and e2 is •'s
+        self.heuristic_x = heuristic_x
+        self.heuristic_o = heuristic_o
+        # incrementally updated heuristics, check_eval compares them with the
+        # from-scratch ones on every move (slow, for debugging)
+        self.incremental = incremental
+        self.check_eval = check_eval
+        # workers > 1 splits alphabeta's root moves over a process pool
+        self.workers = workers
+        # share table entries between positions that are rotations or
+        # reflections of each other, see engine.symmetry. Only searches with
+        # the windows heuristic use it, v1/v2 aren't symmetric
+        self.symmetry = symmetry
+        # game traces, see engine.trace. Files are named after the run id
+        # and the game number so nothing gets overwritten
+        self.trace_formats = trace_formats
+        self.trace_gzip = trace_gzip
+        self.run_id = run_id if run_id is not None else make_run_id()
+        self.trace = None
+        # appended to the game trace file name
+        self.trace_suffix = ''
+        # random blocs and random moves come from here, a seed replays the
+        # same layouts
+        self.rng = random.Random(seed)
         self.check_valid_args()
-        self.initialize_game(blocks)
 
         # scoreboard
         self.i_avg = 0
         self.ii_avg = 0
         self.iv_avg = 0
+        self.v_avg = 0
         self.vi_avg = 0
         self.eval_by_depth_agregate = {}
         self.e1 = 0
         self.e2 = 0
 
+        # ponder searches on the opponent's time, in one worker process per
+        # AI side (see engine.ponder). Without a tt_path the engines share a
+        # table in a temporary file, so a wrong guess still warms the search
+        self.ponder = ponder
+        self.ponderers = {}
+        self.ponder_dir = None
+        if ponder and tt_path is None:
+            self.ponder_dir = tempfile.mkdtemp(prefix='line-em-up-')
+            tt_path = os.path.join(self.ponder_dir, 'tt.bin')
+        self.book = book
+        # the searches, kept across games so the transposition table is too
+        # (bloc layout is part of the key). With a tt_path the table is a
+        # file shared with other runs and processes. From solve_below empty
+        # cells on moves are solved exactly, None turns that off. tactics
+        # only searches forced wins and blocks when there are any, and cells
+        # near the pieces on big boards, ordering=False turns it off too
+        self.engine_options = dict(tt_size=tt_size, tt_replace=tt_replace, ordering=ordering, symmetry=symmetry,
+                                   heuristics=(heuristic_x, heuristic_o), incremental=incremental, check_eval=check_eval,
+                                   workers=workers, tt_path=tt_path, solve_below=solve_below, tactics=tactics, seed=seed)
+        self.engine = Engine(eval_by_depth_agregate=self.eval_by_depth_agregate,
+                             book=OpeningBook.for_config(book, n, s) if book else None, **self.engine_options)
+        self.last_result = None
+        # 'hit' or 'miss' when the last search had a ponder search to take
+        self.ponder_result = None
+
+        self.initialize_game(blocks)
+
     def check_valid_args(self):
         invalid = False
         if self.n < 3 or self.n > 10:
@@ -48,18 +117,23 @@ class Game:
         if self.s < 3 or self.s > self.n:
             print("Invalid argument: s should be in the range [3..n]")
             invalid = True
+        for name in (self.heuristic_x, self.heuristic_o):
+            if name not in heuristics.HEURISTICS:
+                print(f"Invalid argument: heuristic should be one of {list(heuristics.HEURISTICS)}")
+                invalid = True
 
         if invalid:
             quit()
 
 
     def initialize_game(self, blocks=[]):
-        # empty matrix
-        self.current_state = np.zeros((self.n, self.n))
         self.player_turn = '◦'
         self.play_count = self.b
-        self.eval_by_depth = {}
         self.game_count += 1
+        # the scoreboard counters for this game only
+        self.game_stats = {'winner': None, 'i': 0, 'ii': 0, 'iii': {}, 'iv': 0, 'v': 0, 'vi': 0}
+        # (x, y) of every move played, for the trace
+        self.moves = []
 
 
         # initialize blocks
@@ -70,33 +144,45 @@ class Game:
                     print("Invalid argument: block coordinate range [0..n-1]")
                     quit()
 
-                self.current_state[x][y] = 3
-
         else:
-            placed_blocks = 0
-            while placed_blocks < self.b:
-                x = random.randrange(0, self.n)
-                y = random.randrange(0, self.n)
-
-                if self.current_state[x][y] != 3:
-                    self.current_state[x][y] = 3
-                    placed_blocks += 1
+            blocks = []
+            while len(blocks) < self.b:
+                x = self.rng.randrange(0, self.n)
+                y = self.rng.randrange(0, self.n)
+
+                if (x, y) not in blocks:
+                    blocks.append((x, y))
+
+        self.board = Board(self.n, self.s, blocks)
+
+    # a mapped table is only opened by the first search
+    @property
+    def tt(self):
+        return self.engine.tt
+
+    # search counters come with the last search result
+    @property
+    def eval_by_depth(self):
+        if self.last_result is None:
+            return {}
+        return self.last_result.eval_by_depth
+
+    # the position the player to move searches from
+    def position(self, max=False):
+        return Position.from_board(self.board, max)
+
+    # matrix copy of the board, only used by the reference is_end/heuristics
+    @property
+    def current_state(self):
+        state = np.zeros((self.n, self.n))
+        for x in range(0, self.n):
+            for y in range(0, self.n):
+                state[x][y] = self.board.cell(x, y)
+        return state
 
 
     def get_board_state(self):
-        board = ''
-        for y in range(0, self.n):
-            for x in range(0, self.n):
-                if self.current_state[x][y] == 0:
-                    board += '□ '
-                elif self.current_state[x][y] == 1:
-                    board += '◦ '
-                elif self.current_state[x][y] == 2:
-                    board += '• '
-                elif self.current_state[x][y] == 3:
-                    board += '⊠ '
-            board += '\n'
-        return board
+        return render(self.board)
 
     def draw_board(self):
         print()
@@ -105,9 +191,9 @@ class Game:
 
 
     def is_valid(self, px, py):
-        if px < 0 or px > self.n or py < 0 or py > self.n:
+        if px < 0 or px >= self.n or py < 0 or py >= self.n:
             return False
-        elif self.current_state[px][py] != 0:
+        elif self.board.cell(px, py) != EMPTY:
             return False
         else:
             return True
@@ -120,22 +206,25 @@ class Game:
         self.iv = iv
         self.vi = vi
     def is_end(self):
+        # full board scan, kept as a reference for the bitboard engine
+        state = self.current_state
+
         # Vertical win
         prev = -1
         for y in range(0, self.n):
             consecutive = 0
             for x in range(0, self.n):
                 # encounter block or empty
-                if self.current_state[x][y] == 0 or self.current_state[x][y] == 3:
+                if state[x][y] == 0 or state[x][y] == 3:
                     consecutive = 0
                 # encounter previous x or o
-                elif self.current_state[x][y] == prev:
+                elif state[x][y] == prev:
                     consecutive += 1
                     if consecutive == self.s:
-                        return self.current_state[x][y]
+                        return state[x][y]
                 # encounter new x or o
                 else:
-                    prev = self.current_state[x][y]
+                    prev = state[x][y]
                     consecutive = 1
 
         # Horizontal win
@@ -144,16 +233,16 @@ class Game:
             consecutive = 0
             for y in range(0, self.n):
                 # encounter block or empty
-                if self.current_state[x][y] == 0 or self.current_state[x][y] == 3:
+                if state[x][y] == 0 or state[x][y] == 3:
                     consecutive = 0
                 # encounter previous x or o
-                elif self.current_state[x][y] == prev:
+                elif state[x][y] == prev:
                     consecutive += 1
                     if consecutive == self.s:
-                        return self.current_state[x][y]
+                        return state[x][y]
                 # encounter new x or o
                 else:
-                    prev = self.current_state[x][y]
+                    prev = state[x][y]
                     consecutive = 1
 
 
@@ -161,8 +250,8 @@ class Game:
         # the max offset is n - s since |diag[]| with offset n = 0, n-1 = 1, n-2 = 2 ... n-s = s
         for i in range(0, self.n - self.s + 1):
             #### Standard Diagonals ####
-            diag_r = self.current_state.diagonal(offset=i)
-            diag_l = self.current_state.diagonal(offset=-i)
+            diag_r = state.diagonal(offset=i)
+            diag_l = state.diagonal(offset=-i)
 
             # print(f"DEBUG:\n{diag_r}\n{diag_l} ")
 
@@ -203,8 +292,8 @@ class Game:
                     consecutive_l = 1
 
             #### Inverse Diagonals ####
-            diag_r = np.fliplr(self.current_state).diagonal(offset=i)
-            diag_l = np.fliplr(self.current_state).diagonal(offset=-i)
+            diag_r = np.fliplr(state).diagonal(offset=i)
+            diag_l = np.fliplr(state).diagonal(offset=-i)
 
             # print(f"DEBUG:\n{diag_r}\n{diag_l} ")
 
@@ -257,7 +346,7 @@ class Game:
         if self.play_count - self.b < self.s:
             return None
 
-        self.result = self.is_end()
+        self.result = self.board.winner()
         # Printing the appropriate message if the game has ended
         if self.result != None:
             if self.result == 1:
@@ -271,6 +360,11 @@ class Game:
             elif self.result == -1:
                 print("It's a tie!")
                 self.game_trace(info="It's a tie!")
+            if self.trace is not None:
+                self.trace.event(self.board, None, {'type': 'end', 'game': self.game_count, 'winner': self.result, 'moves': self.moves})
+                self.trace.flush()
+            self.game_stats['winner'] = self.result
+            self.last_game_stats = self.game_stats
             self.initialize_game()
         return self.result
 
@@ -297,6 +391,7 @@ class Game:
     Doesn't take into account diagonals
     """
     def heuristic_v1(self):
+        state = self.current_state
         # columns
         score = 0
         h1 = 0
@@ -304,9 +399,9 @@ class Game:
 
         for x in range(0, self.n):
             for y in range(0, self.n):
-                if self.current_state[x][y] == 1:
+                if state[x][y] == 1:
                     score += 1
-                elif self.current_state[x][y] == 2:
+                elif state[x][y] == 2:
                     score -= 1
         # cubed to keep negative
         h1 = score * score * score
@@ -315,9 +410,9 @@ class Game:
         # rows
         for y in range(0, self.n):
             for y in range(0, self.n):
-                if self.current_state[x][y] == 1:
+                if state[x][y] == 1:
                     score += 1
-                elif self.current_state[x][y] == 2:
+                elif state[x][y] == 2:
                     score -= 1
         h2 = score * score * score
         score = 0
@@ -326,6 +421,7 @@ class Game:
 
 
     def heuristic_v2(self):
+        state = self.current_state
         # columns
         score = 0
         h1 = 0
@@ -334,9 +430,9 @@ class Game:
 
         for x in range(0, self.n):
             for y in range(0, self.n):
-                if self.current_state[x][y] == 1:
+                if state[x][y] == 1:
                     score += 1
-                elif self.current_state[x][y] == 2:
+                elif state[x][y] == 2:
                     score -= 1
         # cubed to keep negative
         h1 = score * score * score
@@ -345,9 +441,9 @@ class Game:
         # rows
         for y in range(0, self.n):
             for y in range(0, self.n):
-                if self.current_state[x][y] == 1:
+                if state[x][y] == 1:
                     score += 1
-                elif self.current_state[x][y] == 2:
+                elif state[x][y] == 2:
                     score -= 1
         h2 = score * score * score
         score = 0
@@ -356,8 +452,8 @@ class Game:
         # the max offset is n - s since |diag[]| with offset n = 0, n-1 = 1, n-2 = 2 ... n-s = s
         for i in range(0, self.n - self.s + 1):
             #### Standard Diagonals ####
-            diag_r = self.current_state.diagonal(offset=i)
-            diag_l = self.current_state.diagonal(offset=-i)
+            diag_r = state.diagonal(offset=i)
+            diag_l = state.diagonal(offset=-i)
 
             # print(f"DEBUG:\n{diag_r}\n{diag_l} ")
 
@@ -376,8 +472,8 @@ class Game:
                     score -= 1
 
             #### Inverse Diagonals ####
-            diag_r = np.fliplr(self.current_state).diagonal(offset=i)
-            diag_l = np.fliplr(self.current_state).diagonal(offset=-i)
+            diag_r = np.fliplr(state).diagonal(offset=i)
+            diag_l = np.fliplr(state).diagonal(offset=-i)
 
             # both same length
             # diag_r
@@ -398,127 +494,74 @@ class Game:
         return (h1 + h2 + h3)
 
 
-    def minimax(self, depth, max=False):
-        # Minimizing for 'X' and maximizing for 'O'
-        # Possible values are:
-        # -1 - win for 'X'
-        # 0  - a tie
-        # 1  - loss for 'X'
-        # We're initially setting it to 2 or -2 as worse than the worst case:
-
-
-        if depth == 0:
-            # return (self.heuristic_v2(), -0, -0)
-            if self.player_turn == '◦':
-                return (self.heuristic_v1(), -0, -0)
-            else:
-                return (self.heuristic_v2(), -0, -0)
-
-        self.eval_by_depth[depth] = self.eval_by_depth.get(depth, 0) + 1
-        self.eval_by_depth_agregate[depth] = self.eval_by_depth.get(depth, 0) + 1
-
-        value = 2
-        if max:
-            value = -2
-        x = None
-        y = None
-        result = self.is_end()
-        if result == 1:
-            return (-1, x, y)
-        elif result == 2:
-            return (1, x, y)
-        elif result == -1:
-            return (0, x, y)
-        for i in range(0, self.n):
-            for j in range(0, self.n):
-                if self.current_state[i][j] == 0:
-                    if max:
-                        self.current_state[i][j] = 2
-                        (v, _, _) = self.minimax(depth - 1, max=False)
-                        if v > value:
-                            value = v
-                            x = i
-                            y = j
-                    else:
-                        self.current_state[i][j] = 1
-                        (v, _, _) = self.minimax(depth - 1, max=True)
-                        if v < value:
-                            value = v
-                            x = i
-                            y = j
-                    self.current_state[i][j] = 0
-        return (value, x, y)
-
-
-    def alphabeta(self, depth, alpha=-2, beta=2, max=False):
-        # Minimizing for 'X' and maximizing for 'O'
-        # Possible values are:
-        # -1 - win for 'X'
-        # 0  - a tie
-        # 1  - loss for 'X'
-        # We're initially setting it to 2 or -2 as worse than the worst case:
-
+    def heuristic_name(self):
+        # ◦ searches with e1, • with e2
+        if self.player_turn == '◦':
+            return self.heuristic_x
+        else:
+            return self.heuristic_o
 
+    def heuristic(self):
+        return self.engine.heuristic(self.heuristic_name())
 
-        if depth == 0:
-            # return (self.heuristic_v2(), -0, -0)
-            if self.player_turn == '◦':
-                return (self.heuristic_v1(), -0, -0)
-            else:
-                return (self.heuristic_v2(), -0, -0)
-
-        self.eval_by_depth[depth] = self.eval_by_depth.get(depth, 0) + 1
-        self.eval_by_depth_agregate[depth] = self.eval_by_depth.get(depth, 0) + 1
-
-        value = 2
-        if max:
-            value = -2
-        x = None
-        y = None
-        result = self.is_end()
-        if result == 1:
-            return (-1, x, y)
-        elif result == 2:
-            return (1, x, y)
-        elif result == -1:
-            return (0, x, y)
-        for i in range(0, self.n):
-            for j in range(0, self.n):
-                if self.current_state[i][j] == 0:
-                    if max:
-                        self.current_state[i][j] = 2
-                        (v, _, _) = self.alphabeta(depth - 1, alpha, beta, max=False)
-                        if v > value:
-                            value = v
-                            x = i
-                            y = j
-                    else:
-                        self.current_state[i][j] = 1
-                        (v, _, _) = self.alphabeta(depth - 1, alpha, beta, max=True)
-                        if v < value:
-                            value = v
-                            x = i
-                            y = j
-                    self.current_state[i][j] = 0
-                    if max:
-                        if value >= beta:
-                            return (value, x, y)
-                        if value > alpha:
-                            alpha = value
-                    else:
-                        if value <= alpha:
-                            return (value, x, y)
-                        if value < beta:
-                            beta = value
-        return (value, x, y)
+    def minimax(self, depth, max=False):
+        searcher = self.engine.prepare(self.position(max), self.heuristic_name())
+        return searcher.minimax(depth, max=max)
+
+
+    def alphabeta(self, depth, alpha=-INFINITY, beta=INFINITY, max=False):
+        searcher = self.engine.prepare(self.position(max), self.heuristic_name())
+        return searcher.alphabeta(depth, alpha, beta, max=max)
+
+    # deepens until d or the time limit t, whichever comes first
+    def search(self, depth, algo, max=False):
+        algo = self.ALGOS[algo]
+        position = self.position(max)
+        result = None
+        self.ponder_result = None
+        ponderer = self.ponderers.get(max)
+        if ponderer is not None and ponderer.future is not None:
+            result = ponderer.take(position)
+            self.ponder_result = 'hit' if result is not None else 'miss'
+        if result is None:
+            result = self.engine.search(position, Limits(depth=depth, time=self.t), algo=algo, heuristic=self.heuristic_name())
+        else:
+            # searched in the ponder worker, which keeps no counts of ours
+            for (d, count) in result.eval_by_depth.items():
+                self.eval_by_depth_agregate[d] = self.eval_by_depth_agregate.get(d, 0) + count
+        self.last_result = result
+        return self.last_result
+
+    # searches the position after our move (x, y) and the reply result's PV
+    # expects, while the opponent thinks
+    def start_pondering(self, result, x, y, depth, algo, max=False):
+        if not result.pv or tuple(result.pv[0]) != (x, y):
+            return
+        ponderer = self.ponderers.get(max)
+        if ponderer is None:
+            options = dict(self.engine_options)
+            # a book of its own, an open one can't be sent to the worker
+            options['book'] = OpeningBook.for_config(self.book, self.n, self.s) if self.book else None
+            ponderer = self.ponderers[max] = Ponderer(options)
+        ponderer.start(self.position(max), result.pv, Limits(depth=depth, time=self.t), self.ALGOS[algo], self.heuristic_name())
+
+    def iterative(self, depth, algo, max=False):
+        return self.search(depth, algo, max).as_tuple()
+
+    def close(self):
+        for ponderer in self.ponderers.values():
+            ponderer.close()
+        self.ponderers = {}
+        self.engine.close()
+        if self.ponder_dir is not None:
+            shutil.rmtree(self.ponder_dir, ignore_errors=True)
 
     def random_move(self):
         possible_moves = []
-        for x in range(0, self.n):
-            for y in range(0, self.n):
-                if self.current_state[x][y] == 0:
-                    possible_moves.append((-0, x, y))
-        return possible_moves[random.randrange(0, len(possible_moves))]
+        for move in self.board.empty_moves():
+            (x, y) = self.board.coords(move)
+            possible_moves.append((-0, x, y))
+        return possible_moves[self.rng.randrange(0, len(possible_moves))]
 
 
     def play(self,algo=None,player_x=None,player_o=None):
@@ -529,44 +572,40 @@ class Game:
         if player_o == None:
             player_o = self.HUMAN
 
-        self.game_trace(player_x, player_o, initial=True)
+        self.trace = self.open_trace(player_x, player_o)
         if algo == self.MINIMAX:
             self.game_trace(info='a1=False, a2=False\n')
         elif algo == self.ALPHABETA:
-            self.game_trace("a1=True, a2=True")
-
+            self.game_trace(info='a1=True, a2=True')
+        elif algo == self.PVS:
+            self.game_trace(info='a1=True, a2=True, pvs')
+        elif algo == self.MCTS:
+            self.game_trace(info=f'mcts c={self.engine.mcts_c}')
+        try:
+            return self.play_moves(algo, player_x, player_o)
+        finally:
+            for ponderer in self.ponderers.values():
+                ponderer.cancel()
+            # a game cut short still leaves its trace
+            self.trace.flush()
+
+    def play_moves(self, algo, player_x, player_o):
         while True:
             self.draw_board()
-            state_before_timeout = np.copy(self.current_state)
             if self.check_end():
-                return
+                return self.last_game_stats
             start = time.time()
-            if algo == self.MINIMAX:
-                with Timeout(self.t):
-                    try:
-                        if self.player_turn == '◦':
-                            (_, x, y) = self.minimax(self.d1, max=False)
-                        else:
-                            (_, x, y) = self.minimax(self.d2, max=True)
-                    except timeout.TimeoutError:
-
-                        print("timed out")
-                        self.game_trace(info=f'** Timeout at depth {max(list(self.eval_by_depth.keys()))}**')
-                        self.current_state = state_before_timeout
-                        (_, x, y) = self.random_move()
-
-            else: # algo == self.ALPHABETA
-                with Timeout(self.t):
-                    try:
-                        if self.player_turn == '◦':
-                            (m, x, y) = self.alphabeta(self.d1, max=False)
-                        else:
-                            (m, x, y) = self.alphabeta(self.d2, max=True)
-                    except timeout.TimeoutError:
-                        print("timed out")
-                        self.game_trace(info=f'** Timeout at depth {max(list(self.eval_by_depth.keys()))}**')
-                        self.current_state = state_before_timeout
-                        (_, x, y) = self.random_move()
+            if self.player_turn == '◦':
+                result = self.search(self.d1, algo, max=False)
+            else:
+                result = self.search(self.d2, algo, max=True)
+            (_, x, y) = result.as_tuple()
+
+            if result.timed_out:
+                print("timed out")
+                self.game_trace(info=f'** Timeout at depth {result.depth + 1}**, playing move from depth {result.depth}')
+            if x is None:
+                (_, x, y) = self.random_move()
 
             end = time.time()
 
@@ -584,31 +623,59 @@ class Game:
                 i = round(end - start, 7)
                 ii = sum(self.eval_by_depth.values())
                 iii = self.eval_by_depth
-                iv = sum(AD_helper) / sum(self.eval_by_depth.values())
+                # a book move has no evaluations
+                iv = sum(AD_helper) / sum(self.eval_by_depth.values()) if self.eval_by_depth else 0
                 vi = self.play_count - self.b
+                search_stats = result.stats
+                v = search_stats.average_ply()
 
                 self.i_avg += i
                 self.ii_avg += ii
                 self.iv_avg += iv
+                self.v_avg += v
                 self.vi_avg += vi
 
+                stats = self.game_stats
+                stats['i'] += i
+                stats['ii'] += ii
+                stats['iv'] += iv
+                stats['v'] += v
+                stats['vi'] += vi
+                for (depth, count) in iii.items():
+                    stats['iii'][depth] = stats['iii'].get(depth, 0) + count
+
                 game_trace_info = f'''Player {self.player_turn} under AI control plays: x = {x}, y = {y}
 i\tEvaluation time: {i}s
 ii\tHeuristic evaluations: {ii}
 iii\tEvaluations by depth: {iii}
 iv\tAverage evaluation depth {iv}
-v\tAverage recursion depth
+v\tAverage recursion depth {v}
 vi\tTotal number of moves: {vi}
+Stats\t{search_stats}
 '''
-                self.game_trace(info=game_trace_info)
-
-            self.eval_by_depth = {}
+                if self.ponder_result is not None:
+                    game_trace_info += f'Ponder\t{self.ponder_result}\n'
+                if result.book:
+                    game_trace_info += 'Book\tmove from the opening book\n'
+                if result.solved:
+                    game_trace_info += f'Solver\tproven {["◦ wins", "tie", "• wins"][outcome(result.value) + 1]}\n'
+                if result.tt_stats is not None:
+                    game_trace_info += f'TT\t{result.tt_stats}\n'
+                if result.ordering_stats is not None:
+                    game_trace_info += f'Ordering\t{result.ordering_stats}\n'
+                self.game_trace(info=game_trace_info, record={'type': 'move', 'game': self.game_count, 'player': self.player_turn, 'x': x, 'y': y, 'move': vi, 'time': i, 'pv': result.pv, 'book': result.book, 'solved': result.solved, 'ponder': self.ponder_result, **search_stats.to_dict()})
+                if self.ponder:
+                    if self.player_turn == '◦':
+                        self.start_pondering(result, x, y, self.d1, algo, max=False)
+                    else:
+                        self.start_pondering(result, x, y, self.d2, algo, max=True)
 
+            self.moves.append((x, y))
             if(self.player_turn == '◦'):
-                self.current_state[x][y] = 1
+                self.board.make(self.board.move(x, y), WHITE)
                 self.play_count += 1
             elif(self.player_turn == '•'):
-                self.current_state[x][y] = 2
+                self.board.make(self.board.move(x, y), BLACK)
                 self.play_count += 1
             else:
                 print("OOPS, SOMETHING WENT WRONG")
@@ -616,28 +683,19 @@ vi\tTotal number of moves: {vi}
             self.switch_player()
 
 
-    def game_trace(self, player_x=None, player_o=None, info=None, initial=False):
-        file_name = f'out/gameTrace-{self.n}{self.b}{self.s}{self.t}.txt'
-        if player_x == 3:
-            player_x = f'AI d={self.d1} e1'
-        else:
-            player_x = 'HUMAN'
-        if player_o == 3:
-            player_o = f'AI d={self.d2} e2'
-        else:
-            player_o = 'HUMAN'
+    def open_trace(self, player_x, player_o):
+        name = f'out/{{kind}}-{self.n}{self.b}{self.s}{self.t}{self.trace_suffix}-{self.run_id}-{self.game_count}'
+        trace = GameTrace(name, self.trace_formats, self.trace_gzip)
+        players = []
+        for (player, d, e) in ((player_x, self.d1, 'e1'), (player_o, self.d2, 'e2')):
+            players.append(f'AI d={d} {e}' if player == self.AI else 'HUMAN')
+        trace.header({'n': self.n, 'b': self.b, 's': self.s, 't': self.t, 'game': self.game_count,
+                      'player_x': players[0], 'player_o': players[1], 'blocks': self.position().blocks})
+        return trace
 
-        if initial:
-            with open(file_name, 'w') as f:
-                f.write(f'n={self.n} b={self.b} s={self.s} t={self.t}\n')
-                f.write(f'\nPlayer 1: {player_x}\n')
-                f.write(f'Player 2: {player_o}\n')
-                # f.write(f'\n{self.get_board_state()}\n')
-
-        else:
-            with open(file_name, 'a') as f:
-                f.write(f'\n{self.get_board_state()}\n')
-                f.write(f'\n{info}\n')
+    # board and info in the text trace, record (or info) in the JSON one
+    def game_trace(self, info=None, record=None):
+        self.trace.event(self.board, info, record)
 
     def scoreboard(self, initial=False):
         file_name = f'out/scoreboard.txt'
@@ -666,69 +724,47 @@ vi\tTotal number of moves: {vi}
             f.write(f'ii\tTotal heuristic evaluations: {self.ii_avg/self.game_count:.2f}\n')
             f.write(f'iii\tEvaluations by depth: {self.eval_by_depth_agregate}\n')
             f.write(f'iv\tTotal evaluation depth: {self.iv_avg/self.game_count:.2f}\n')
-            f.write(f'v\tTotal recursion depth: \n')
+            f.write(f'v\tTotal recursion depth: {self.v_avg/self.game_count:.2f}\n')
             f.write(f'vi\tAverage moves per game: {self.vi_avg/self.game_count:.2f}\n')
-
+            if self.ponder:
+                hits = sum(ponderer.hits for ponderer in self.ponderers.values())
+                misses = sum(ponderer.misses for ponderer in self.ponderers.values())
+                f.write(f'Ponder hits: {hits} of {hits + misses}\n')
+
+
+
+# (n, b, s, t, d1, d2, algo, blocks)
+CONFIGS = [
+    (4, 4, 3, 5, 6, 6, Game.MINIMAX, [(0,0), (0,3), (3,0), (3,3)]),
+    (4, 4, 3, 1, 6, 6, Game.ALPHABETA, [(0,0), (0,3), (3,0), (3,3)]),
+    (5, 4, 4, 1, 2, 6, Game.ALPHABETA, []),
+    (5, 4, 4, 5, 6, 6, Game.ALPHABETA, []),
+    (8, 5, 5, 1, 2, 6, Game.ALPHABETA, []),
+    (8, 5, 5, 5, 2, 6, Game.ALPHABETA, []),
+    (8, 6, 5, 1, 6, 6, Game.ALPHABETA, []),
+    (8, 6, 5, 5, 6, 6, Game.ALPHABETA, []),
+]
+
+
+def play_game(config, game):
+    # one tournament game, runs in a worker process. A config with a seed
+    # gives every game its own reproducible random blocs
+    seed = config.get('seed')
+    if seed is not None:
+        seed = f'{seed}-{game}'
+    g = Game(n=config['n'], b=config['b'], s=config['s'], t=config['t'], d1=config['d1'], d2=config['d2'], blocks=config['blocks'], seed=seed)
+    g.trace_suffix = f'-{game}'
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = g.play(algo=config['algo'], player_x=Game.AI, player_o=Game.AI)
+    g.close()
+    return stats
 
 
 def main():
 
     start = time.time()
-    #1
-    g = Game(n=4, b=4, s=3, t=5, d1=6, d2=6, blocks=[(0,0), (0,3), (3,0), (3,3)])
-    g.scoreboard(True)
-    for i in range(10):
-        g.play(algo=Game.MINIMAX, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
-
-    # 2
-    g = Game(n=4, b=4, s=3, t=1, d1=6, d2=6, blocks=[(0,0), (0,3), (3,0), (3,3)])
-    g.scoreboard()
-    for i in range(10):
-        g.play(algo=Game.ALPHABETA, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
-
-    # 3
-    g = Game(n=5, b=4, s=4, t=1, d1=2, d2=6)
-    g.scoreboard()
-    for i in range(10):
-        g.play(algo=Game.ALPHABETA, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
-
-    # 4
-    g = Game(n=5, b=4, s=4, t=5, d1=6, d2=6)
-    g.scoreboard()
-    for i in range(10):
-        g.play(algo=Game.ALPHABETA, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
-
-    # 5
-    g = Game(n=8, b=5, s=5, t=1, d1=2, d2=6)
-    g.scoreboard()
-    for i in range(10):
-        g.play(algo=Game.ALPHABETA, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
-
-    # 6
-    g = Game(n=8, b=5, s=5, t=5, d1=2, d2=6)
-    g.scoreboard()
-    for i in range(10):
-        g.play(algo=Game.ALPHABETA, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
-
-    # 7
-    g = Game(n=8, b=6, s=5, t=1, d1=6, d2=6)
-    g.scoreboard()
-    for i in range(10):
-        g.play(algo=Game.ALPHABETA, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
-
-    # 8
-    g = Game(n=8, b=6, s=5, t=5, d1=6, d2=6)
-    g.scoreboard()
-    for i in range(10):
-        g.play(algo=Game.ALPHABETA, player_x=Game.AI, player_o=Game.AI)
-    g.scoreboard_update()
+    results = run_tournament(CONFIGS, play_game, games=10, workers=os.cpu_count())
+    write_scoreboard(CONFIGS, results)
     end = time.time()
 
     print(f'Done in: {round(end - start, 7)}s')
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def line_em_up():
+    # line-em-up.py isn't importable by name
+    spec = importlib.util.spec_from_file_location('line_em_up', os.path.join(ROOT, 'line-em-up.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,60 @@
+# winner_at()/wins_at() only look at the lines through the last move,
+# Board.winner() and the original Game.is_end() scan the whole board and are
+# the reference.
+
+import random
+
+import pytest
+
+from engine import Board, WHITE, BLACK
+
+CONFIGS = [(3, 3, 0), (4, 3, 2), (5, 4, 0), (5, 4, 4), (6, 5, 3), (7, 4, 6), (8, 5, 5), (10, 6, 8)]
+
+
+def random_game(rng, n, s, b):
+    cells = [(x, y) for x in range(n) for y in range(n)]
+    rng.shuffle(cells)
+    return (cells[:b], cells[b:])
+
+
+@pytest.mark.parametrize('n, s, b', CONFIGS)
+def test_winner_at_matches_full_scan(n, s, b):
+    rng = random.Random(f'{n}-{s}-{b}')
+    for _ in range(50):
+        (blocks, moves) = random_game(rng, n, s, b)
+        board = Board(n, s, blocks)
+        assert board.winner() is None
+        for (i, (x, y)) in enumerate(moves):
+            piece = WHITE if i % 2 == 0 else BLACK
+            move = board.move(x, y)
+            board.make(move, piece)
+            expected = board.winner()
+            assert board.winner_at(move, piece) == expected
+            assert board.wins_at(move, piece) == (expected == piece)
+            if expected is not None:
+                break
+
+
+@pytest.mark.parametrize('n, s, b', CONFIGS)
+def test_winner_matches_game_is_end(line_em_up, n, s, b):
+    rng = random.Random(f'is_end-{n}-{s}-{b}')
+    (blocks, _) = random_game(rng, n, s, b)
+    game = line_em_up.Game(n=n, b=b, s=s, blocks=blocks)
+    try:
+        for _ in range(20):
+            (_, moves) = random_game(rng, n, s, 0)
+            moves = [cell for cell in moves if cell not in blocks]
+            game.board = Board(n, s, blocks)
+            game.play_count = b
+            for (i, (x, y)) in enumerate(moves):
+                piece = WHITE if i % 2 == 0 else BLACK
+                move = game.board.move(x, y)
+                game.board.make(move, piece)
+                game.play_count += 1
+                expected = game.is_end()
+                assert game.board.winner_at(move, piece) == expected
+                assert game.board.winner() == expected
+                if expected is not None:
+                    break
+    finally:
+        game.close()
@@ -0,0 +1,26 @@
+# Book entries against searching the same position directly.
+
+import pytest
+
+from engine.api import Engine, Position, Limits
+from engine.book import build, OpeningBook
+
+CORNERS = [(0, 0), (0, 4), (4, 0), (4, 4)]
+
+
+@pytest.mark.parametrize('heuristic', ['v2', 'windows'])
+def test_book_matches_search(tmp_path, heuristic):
+    path = build(str(tmp_path), 5, 4, [[], CORNERS], 2, 3, heuristic=heuristic, extend=False)
+    book = OpeningBook(path)
+    try:
+        for blocks in ([], CORNERS):
+            cells = [(x, y) for x in range(5) for y in range(5) if (x, y) not in blocks]
+            for position in [Position(5, 4, blocks)] + [Position(5, 4, blocks, [cell]) for cell in cells]:
+                hit = book.probe(position, heuristic)
+                assert hit is not None
+                result = Engine(heuristics=(heuristic,)).search(position, Limits(depth=3), heuristic=heuristic)
+                assert hit[2] == result.value
+                # the other side's heuristic doesn't get book moves
+                assert book.probe(position, 'v1') is None
+    finally:
+        book.close()
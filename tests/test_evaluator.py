@@ -0,0 +1,54 @@
+# IncrementalEvaluator(check=True) compares every update with the from-scratch
+# heuristics and raises AssertionError on a difference.
+
+import random
+
+import pytest
+
+from engine import Board, IncrementalEvaluator, HEURISTICS, WHITE, BLACK
+
+CONFIGS = [(3, 3, 0), (5, 4, 3), (6, 4, 0), (7, 5, 6), (10, 6, 10)]
+
+
+@pytest.mark.parametrize('name', ['v1', 'v2', 'windows'])
+@pytest.mark.parametrize('n, s, b', CONFIGS)
+def test_make_unmake_random_sequences(name, n, s, b):
+    rng = random.Random(f'{name}-{n}-{s}-{b}')
+    cells = [(x, y) for x in range(n) for y in range(n)]
+    rng.shuffle(cells)
+    board = Board(n, s, cells[:b])
+    evaluator = IncrementalEvaluator(board, (name,), check=True)
+    heuristic = evaluator.heuristics[name]
+    start = heuristic()
+    free = cells[b:]
+    for _ in range(30):
+        # play a random prefix, take back a random part of it, play on
+        played = []
+        rng.shuffle(free)
+        for (i, (x, y)) in enumerate(free[:rng.randrange(1, len(free) + 1)]):
+            piece = WHITE if i % 2 == 0 else BLACK
+            board.make(board.move(x, y), piece)
+            played.append((board.move(x, y), piece))
+        for _ in range(rng.randrange(0, len(played) + 1)):
+            (move, piece) = played.pop()
+            board.unmake(move, piece)
+        assert heuristic() == HEURISTICS[name](board)
+        while played:
+            (move, piece) = played.pop()
+            board.unmake(move, piece)
+        assert heuristic() == start
+
+
+@pytest.mark.parametrize('n, s, b', CONFIGS)
+def test_restore_recounts(n, s, b):
+    rng = random.Random(f'restore-{n}-{s}-{b}')
+    cells = [(x, y) for x in range(n) for y in range(n)]
+    rng.shuffle(cells)
+    board = Board(n, s, cells[:b])
+    evaluator = IncrementalEvaluator(board, ('v1', 'v2', 'windows'), check=True)
+    snapshot = board.snapshot()
+    for (i, (x, y)) in enumerate(cells[b:]):
+        board.make(board.move(x, y), WHITE if i % 2 == 0 else BLACK)
+    board.restore(snapshot)
+    for (name, heuristic) in evaluator.heuristics.items():
+        assert heuristic() == HEURISTICS[name](board)
@@ -0,0 +1,36 @@
+# The root split over workers against the serial search.
+
+import random
+
+import pytest
+
+from engine.api import Engine, Position, Limits
+
+
+@pytest.fixture(scope='module')
+def engines():
+    # one pool per option set for the whole module, pools are slow to start
+    engines = {ordering: Engine(workers=2, ordering=ordering, tactics=True) for ordering in (True, False)}
+    yield engines
+    for engine in engines.values():
+        engine.close()
+
+
+@pytest.mark.parametrize('ordering', [True, False])
+def test_parallel_matches_serial(engines, ordering):
+    rng = random.Random(f'parallel-{ordering}')
+    checked = 0
+    while checked < 8:
+        n = rng.choice((4, 5))
+        cells = [(x, y) for x in range(n) for y in range(n)]
+        rng.shuffle(cells)
+        played = rng.randrange(1, 6)
+        position = Position(n, n - 1, cells[:2], cells[2:2 + played:2], cells[3:2 + played:2])
+        if position.to_board().winner() is not None:
+            continue
+        limits = Limits(depth=3)
+        parallel = engines[ordering].search(position, limits, 'alphabeta', 'v2')
+        serial = Engine(ordering=ordering, tactics=True).search(position, limits, 'alphabeta', 'v2')
+        assert parallel.depth == 3
+        assert parallel.value == serial.value
+        checked += 1
@@ -0,0 +1,59 @@
+# Search options that must not change the value a search finds.
+
+import random
+
+import pytest
+
+from engine.api import Engine, Position, Limits
+
+# corner blocs keep every symmetry of the square
+CORNERS = [(0, 0), (0, 5), (5, 0), (5, 5)]
+
+
+def opening(rng, n, s, blocks, pieces):
+    cells = [(x, y) for x in range(n) for y in range(n) if (x, y) not in blocks]
+    rng.shuffle(cells)
+    return Position(n, s, blocks, cells[:pieces:2], cells[1:pieces:2])
+
+
+@pytest.mark.parametrize('heuristic', ['v1', 'v2', 'windows'])
+def test_symmetry_keeps_values(heuristic):
+    # few pieces, so positions are often symmetric and transforms get used
+    rng = random.Random(f'symmetry-{heuristic}')
+    for _ in range(20):
+        position = opening(rng, 6, 4, CORNERS, rng.randrange(4))
+        values = [Engine(symmetry=symmetry, heuristics=(heuristic,)).search(
+                      position, Limits(depth=3), 'alphabeta', heuristic).value
+                  for symmetry in (True, False)]
+        assert values[0] == values[1]
+
+
+# (n, s, blocs, depth)
+CONFIGS = [(4, 3, 0, 4), (5, 4, 2, 3), (6, 4, 3, 3)]
+
+
+def positions(name, n, s, b, count=8):
+    # seeded positions a few moves in, nobody has won yet
+    rng = random.Random(f'{name}-{n}-{s}-{b}')
+    found = []
+    while len(found) < count:
+        cells = [(x, y) for x in range(n) for y in range(n)]
+        rng.shuffle(cells)
+        position = opening(rng, n, s, cells[:b], rng.randrange(1, 6))
+        if position.to_board().winner() is None:
+            found.append(position)
+    return found
+
+
+@pytest.mark.parametrize('n, s, b, depth', CONFIGS)
+@pytest.mark.parametrize('heuristic', ['v2', 'windows'])
+def test_alphabeta_and_pvs_match_minimax(n, s, b, depth, heuristic):
+    # with a table, move ordering and aspiration windows the values stay
+    # those of plain minimax
+    for position in positions('pvs', n, s, b):
+        limits = Limits(depth=depth)
+        expected = Engine(tt_size=0, ordering=False, heuristics=(heuristic,)).search(
+            position, limits, 'minimax', heuristic).value
+        for algo in ('alphabeta', 'pvs'):
+            result = Engine(heuristics=(heuristic,)).search(position, limits, algo, heuristic)
+            assert result.value == expected, algo
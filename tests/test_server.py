@@ -0,0 +1,27 @@
+# GameServer.dispatch() answers every line, also the ones it can't serve.
+
+import asyncio
+import json
+
+from engine.server import GameServer
+
+
+def dispatch(server, request):
+    return asyncio.run(server.dispatch(request if isinstance(request, bytes) else json.dumps(request).encode()))
+
+
+def test_bad_requests_get_errors():
+    server = GameServer(workers=1)
+    try:
+        for line in (b'[1, 2]', b'"x"', b'5', b'null', b'{', b'{"op": "nope"}'):
+            assert 'error' in dispatch(server, line)
+        assert 'error' in dispatch(server, {'op': 'new', 'n': 5, 's': 6})
+        session = dispatch(server, {'op': 'new', 'n': 3, 's': 3, 'depth': 2})['session']
+        assert dispatch(server, {'op': 'search', 'session': session})['result']['move'] is not None
+        # a pool that can't run searches anymore
+        server.pool.shutdown()
+        reply = dispatch(server, {'op': 'search', 'session': session})
+        assert 'error' in reply
+        assert server.metrics.to_dict(1)['in_flight'] == 0
+    finally:
+        server.close()
@@ -0,0 +1,46 @@
+# Engine.solve() and the Solver against plain searches.
+
+import random
+
+from engine.api import Engine, Position, Limits
+
+# ◦ has three in a row on 3x3
+WON = Position(3, 3, [], [(0, 0), (0, 1), (0, 2)], [(1, 0), (1, 1)])
+# full 3x3 board, nobody has three in a row
+TIED = Position(3, 3, [], [(0, 0), (0, 1), (1, 2), (2, 0), (2, 2)], [(0, 2), (1, 0), (1, 1), (2, 1)])
+
+
+def test_solve_game_over():
+    for position in (WON, TIED):
+        solved = Engine(solve_below=12).search(position, Limits(depth=2))
+        searched = Engine().search(position, Limits(depth=2))
+        assert solved.solved
+        assert solved.move is None
+        assert solved.as_tuple() == searched.as_tuple()
+
+
+def test_solver_matches_exhaustive_alphabeta():
+    # 4x4 positions with 8 to 10 empty cells: the solver's result against
+    # alphabeta searched to the end of the game, one ply past the last
+    # empty cell so the full board is scored as a result
+    rng = random.Random('solver')
+    checked = 0
+    outcomes = set()
+    while checked < 20:
+        cells = [(x, y) for x in range(4) for y in range(4)]
+        rng.shuffle(cells)
+        b = rng.randrange(3)
+        played = 16 - b - rng.randrange(8, 11)
+        # s = 4 ends in ties as well
+        position = Position(4, 3 + checked % 2, cells[:b], cells[b:b + played:2], cells[b + 1:b + played:2])
+        board = position.to_board()
+        if board.winner() is not None:
+            continue
+        empty = len(board.empty_moves())
+        solved = Engine(solve_below=16).search(position, Limits())
+        searched = Engine(tt_size=0, ordering=False).search(position, Limits(depth=empty + 1))
+        assert solved.solved
+        assert solved.value == searched.value
+        outcomes.add((solved.value > 0) - (solved.value < 0))
+        checked += 1
+    assert len(outcomes) == 3
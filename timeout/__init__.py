@@ -1 +1,2 @@
-from .timeout import Timeout
+from .timeout import Timeout, TimeoutError
+from .deadline import Deadline
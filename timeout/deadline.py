@@ -0,0 +1,30 @@
+import time
+
+from .timeout import TimeoutError
+
+
+class Deadline:
+    """
+    Cooperative time limit: the search polls check() instead of being
+    interrupted by SIGALRM, so it works outside the main thread and with
+    fractions of a second.
+    """
+
+    def __init__(self, seconds=1, error_message="Timeout"):
+        self.seconds = seconds
+        self.error_message = error_message
+        self.start = time.perf_counter()
+        self.end = self.start + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        return self.end - time.perf_counter()
+
+    def expired(self):
+        return time.perf_counter() >= self.end
+
+    def check(self):
+        if time.perf_counter() >= self.end:
+            raise TimeoutError(self.error_message)